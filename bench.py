@@ -0,0 +1,524 @@
+import sys
+import time
+from typing import Self
+from typing import Callable
+
+import numpy as np
+import pygame as pg
+
+from ract.utils import gen_tile_key
+from systems.tiles import TileGrid
+from systems.shading import ShadeTable
+from systems.floor import FloorCaster
+from systems.lighting import LightGrid
+from systems.sprites import SpriteRenderer
+from systems.raycast import cast_rays
+from systems.entities import EntityStore
+from systems.spatial import SpatialHash
+from systems.collision import resolve_tiles
+from systems.projectiles import ProjectilePool
+from systems.hitscan import hitscan
+from systems.hitscan import gen_spread
+from systems.particles import ParticleSystem
+from systems.audio import AudioEngine
+from systems.memory import MemoryReport
+from systems.raycast import gen_plane
+from systems.raycast import gen_column_dirs
+
+
+# Usage: python3 bench.py [name ...]
+# Every benchmark returns {label: ms per frame}
+
+FRAMES = 200
+SURF_SIZE = (320, 240)
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def time_frames(func: Callable, frames: int) -> float:
+    func() # warm up (fills caches)
+    start = time.perf_counter()
+    for frame in range(frames):
+        func()
+    return (time.perf_counter() - start) / frames * 1000
+
+
+@benchmark('shading')
+def bench_shading(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    width, height = SURF_SIZE
+    render_distance = 8
+    darkness = 1
+    columns = rng.integers(0, 256, (width, height, 3), dtype=np.uint8)
+    distances = rng.uniform(0, render_distance, width)
+    textures = [pg.Surface((64, 64)) for i in range(4)]
+    for texture in textures:
+        texture.fill(tuple(rng.integers(0, 256, 3)))
+    texture_ids = rng.integers(0, len(textures), width)
+    shades = ShadeTable(render_distance)
+    # both sides write into buffers they reuse like the renderer would
+    out = np.empty_like(columns)
+    scratch = pg.Surface((64, 64))
+
+    def multiply() -> None:
+        factors = np.clip(
+            1 - darkness * distances / render_distance, 0, 1,
+        ).astype(np.float32)
+        np.multiply(
+            columns, factors[:, None, None], out=out, casting='unsafe',
+        )
+
+    def banded() -> None:
+        shades.shade(columns, darkness, distances[:, None], out=out)
+
+    def multiply_textures() -> None:
+        for dex, distance in enumerate(distances):
+            factor = max(1 - darkness * distance / render_distance, 0)
+            value = int(factor * 255)
+            scratch.blit(textures[texture_ids[dex]], (0, 0))
+            scratch.fill(
+                (value, value, value), special_flags=pg.BLEND_RGB_MULT,
+            )
+
+    def banded_textures() -> None:
+        for dex, distance in enumerate(distances):
+            shades.texture(textures[texture_ids[dex]], darkness, distance)
+
+    return {
+        'multiply columns': time_frames(multiply, frames),
+        'banded columns': time_frames(banded, frames),
+        'multiply textures': time_frames(multiply_textures, frames),
+        'banded textures': time_frames(banded_textures, frames),
+    }
+
+
+@benchmark('floor')
+def bench_floor(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    tilemap = {
+        gen_tile_key((x, y)): {
+            'elevation': 0,
+            'height': 0,
+            'top': tuple(int(value) for value in rng.integers(0, 256, 3)),
+            'bottom': tuple(int(value) for value in rng.integers(0, 256, 3)),
+        }
+        for x in range(64) for y in range(64)
+    }
+    grid = TileGrid(tilemap)
+    surf = pg.Surface(SURF_SIZE)
+    forward = pg.Vector2(1, 0)
+    results = {}
+    for label, shades in (('unshaded', None), ('shaded', ShadeTable(8))):
+        floor = FloorCaster(SURF_SIZE, 90, SURF_SIZE[0] / 2, grid, shades)
+
+        def render() -> None:
+            forward.rotate_ip(1)
+            floor.render(surf, (32, 32), forward, 0.5, 0.5)
+
+        results[label] = time_frames(render, frames)
+
+    # a short muzzle flash every few frames, only its window is rebuilt
+    lights = LightGrid(grid)
+    frame = [0]
+
+    def render() -> None:
+        forward.rotate_ip(1)
+        frame[0] += 1
+        if not frame[0] % 4:
+            lights.add(rng.uniform(8, 56, 2), radius=4, duration=8)
+        lights.update(1)
+        floor.render(surf, (32, 32), forward, 0.5, 0.5, lights=lights)
+
+    results['shaded, lit'] = time_frames(render, frames)
+    return results
+
+
+@benchmark('sprites')
+def bench_sprites(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    surf = pg.Surface(SURF_SIZE)
+    sprite = pg.Surface((32, 64))
+    sprite.fill((255, 255, 255))
+    depth = rng.uniform(1, 8, SURF_SIZE[0])
+    forward = pg.Vector2(1, 0)
+    renderer = SpriteRenderer(
+        SURF_SIZE, 90, SURF_SIZE[0] / 2, ShadeTable(8),
+    )
+    results = {}
+    for count in (10, 100, 500):
+        positions = rng.uniform(-8, 8, (count, 2))
+        elevations = np.zeros(count)
+        heights = np.full(count, 0.6)
+        sprites = [sprite] * count
+
+        def render() -> None:
+            forward.rotate_ip(1)
+            renderer.draw(
+                surf,
+                sprites,
+                positions,
+                elevations,
+                heights,
+                (0, 0),
+                forward,
+                0.5,
+                0.5,
+                depth,
+            )
+
+        results[f'{count} sprites'] = time_frames(render, frames)
+    return results
+
+
+@benchmark('raycast')
+def bench_raycast(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    walls = rng.random((64, 64)) < 0.2
+    plane = gen_plane(SURF_SIZE[0], 90)
+    forward = pg.Vector2(1, 0)
+    results = {}
+    # full tile rects block exactly like plain walls, so they measure what
+    # the geometry test adds, thin walls let rays see about 3x further
+    # past them so they also pay for the extra cells crossed
+    for label, data in (
+        ('plain walls', {'height': 1}),
+        ('full tile rects', {'height': 1, 'rect': (0, 0, 1, 1)}),
+        ('thin walls', {
+            'height': 1,
+            'rect': (0.2, 0, 0.0001, 1),
+            'semitile': {'axis': 1, 'pos': (0.2, 0.5), 'width': 1},
+        }),
+    ):
+        tilemap = {
+            gen_tile_key((x, y)): dict(data)
+            for x, y in zip(*np.nonzero(walls))
+        }
+        grid = TileGrid(tilemap)
+
+        def cast() -> None:
+            forward.rotate_ip(1)
+            cast_rays(
+                grid,
+                (32.5, 32.5),
+                gen_column_dirs(forward, plane),
+                8,
+                z=0.5,
+            )
+
+        results[label] = time_frames(cast, frames)
+    return results
+
+
+@benchmark('entities')
+def bench_entities(frames: int) -> dict:
+    # the same integration done one python object at a time
+    class Body(object):
+        def __init__(self: Self, pos: pg.Vector2) -> None:
+            self.pos = pos
+            self.velocity2 = pg.Vector2(0.05, 0.02)
+            self.elevation = 0
+            self.elevation_velocity = 0
+            self.friction = 0.9
+
+        def update(self: Self, rel_game_speed: float) -> None:
+            self.velocity2 *= self.friction ** rel_game_speed
+            self.pos += self.velocity2 * rel_game_speed
+            self.elevation_velocity -= 0.004 * rel_game_speed
+            self.elevation += self.elevation_velocity * rel_game_speed
+
+    results = {}
+    for count in (10, 100, 500):
+        bodies = [Body(pg.Vector2(dex, 0)) for dex in range(count)]
+        store = EntityStore()
+        for dex in range(count):
+            store.spawn((dex, 0)).velocity2 = (0.05, 0.02)
+
+        def objects() -> None:
+            for body in bodies:
+                body.update(1)
+
+        results[f'{count} objects'] = time_frames(objects, frames)
+        results[f'{count} batched'] = time_frames(
+            lambda: store.step(1), frames,
+        )
+    return results
+
+
+@benchmark('spatial')
+def bench_spatial(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    results = {}
+    for count in (100, 1000):
+        store = EntityStore(count)
+        for pos in rng.uniform(0, 64, (count, 2)):
+            store.spawn(pos)
+        entities = store.entities
+        spatial = SpatialHash()
+        for entity in entities:
+            spatial.insert(entity, entity.pos)
+        queries = rng.uniform(0, 64, (32, 2))
+
+        def brute() -> None:
+            for query in queries:
+                [
+                    entity for entity in entities
+                    if entity.pos.distance_squared_to(query) <= 4
+                ]
+
+        def hashed() -> None:
+            for query in queries:
+                spatial.query_radius(query, 2)
+
+        results[f'{count} brute force'] = time_frames(brute, frames)
+        results[f'{count} hashed'] = time_frames(hashed, frames)
+    return results
+
+
+@benchmark('collision')
+def bench_collision(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    walls = rng.random((64, 64)) < 0.2
+    grid = TileGrid({
+        gen_tile_key((x, y)): {'height': 1}
+        for x, y in zip(*np.nonzero(walls))
+    })
+    results = {}
+    for count in (10, 100, 500):
+        store = EntityStore(count)
+        for pos in rng.uniform(0, 64, (count, 2)):
+            store.spawn(pos).velocity2 = rng.uniform(-0.1, 0.1, 2)
+        bodies = [
+            [array[dex:dex + 1] for array in (
+                store.pos,
+                store.elevation,
+                store.elevation_velocity,
+                store.height,
+                store.radius,
+                store.climb,
+            )]
+            for dex in range(count)
+        ]
+
+        def one_at_a_time() -> None:
+            for pos, elevation, velocity, height, radius, climb in bodies:
+                resolve_tiles(
+                    grid,
+                    pos.copy(),
+                    pos,
+                    elevation.copy(),
+                    elevation,
+                    velocity,
+                    height,
+                    radius,
+                    climb,
+                )
+
+        results[f'{count} one at a time'] = time_frames(one_at_a_time, frames)
+        results[f'{count} batched'] = time_frames(
+            lambda: store.step(1, grid), frames,
+        )
+    return results
+
+
+@benchmark('projectiles')
+def bench_projectiles(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    walls = rng.random((64, 64)) < 0.05
+    tilemap = {
+        gen_tile_key((x, y)): {'height': 1}
+        for x, y in zip(*np.nonzero(walls))
+    }
+    grid = TileGrid(tilemap)
+    spatial = SpatialHash()
+    store = EntityStore(50)
+    for pos in rng.uniform(0, 64, (50, 2)):
+        spatial.insert(store.spawn(pos), pos)
+    results = {}
+    for count in (10, 100, 500):
+        # one object per shot, moved in 0.1 tile steps against the dict
+        shots = []
+
+        def objects() -> None:
+            while len(shots) < count:
+                shots.append({
+                    'pos': pg.Vector2(tuple(rng.uniform(0, 64, 2))),
+                    'velocity': pg.Vector2(0.3, 0).rotate(rng.uniform(0, 360)),
+                })
+            for shot in shots[:]:
+                for _ in range(3):
+                    shot['pos'] += shot['velocity'] / 3
+                    if (gen_tile_key(shot['pos']) in tilemap
+                        or spatial.query_radius(shot['pos'], 0.3)):
+                        shots.remove(shot)
+                        break
+
+        pool = ProjectilePool(count)
+
+        def pooled() -> None:
+            for _ in range(count - pool.count):
+                pool.spawn(
+                    rng.uniform(0, 64, 2), 0.3, rng.uniform(0, 360), 0.3,
+                )
+            pool.step(1, grid, spatial)
+
+        results[f'{count} objects'] = time_frames(objects, frames)
+        results[f'{count} pooled'] = time_frames(pooled, frames)
+    return results
+
+
+@benchmark('hitscan')
+def bench_hitscan(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    walls = rng.random((64, 64)) < 0.05
+    grid = TileGrid({
+        gen_tile_key((x, y)): {'height': 1}
+        for x, y in zip(*np.nonzero(walls))
+    })
+    spatial = SpatialHash()
+    store = EntityStore(50)
+    for pos in rng.uniform(0, 64, (50, 2)):
+        spatial.insert(store.spawn(pos), pos)
+    results = {}
+    for pellets in (8, 32):
+        yaws = gen_spread(45, pellets, 20, rng=rng)
+
+        def per_pellet() -> None:
+            for yaw in yaws:
+                hitscan(grid, (32, 32), 0.3, (yaw, ), 16, spatial=spatial)
+
+        def batched() -> None:
+            hitscan(grid, (32, 32), 0.3, yaws, 16, spatial=spatial)
+
+        results[f'{pellets} pellets one by one'] = time_frames(
+            per_pellet, frames,
+        )
+        results[f'{pellets} pellets batched'] = time_frames(batched, frames)
+    return results
+
+
+@benchmark('particles')
+def bench_particles(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    surf = pg.Surface(SURF_SIZE)
+    depth = rng.uniform(1, 8, SURF_SIZE[0])
+    results = {}
+    for count in (256, 4096):
+        particles = ParticleSystem(
+            SURF_SIZE, 90, SURF_SIZE[0] / 2, ShadeTable(8), capacity=count,
+        )
+
+        def tick() -> None:
+            particles.emit(
+                (4, 0), 0.5, count // 30, yaw=180, spread=90, rng=rng,
+            )
+            particles.update(1)
+            particles.render(surf, (0, 0), (1, 0), 0.5, 0.5, depth)
+
+        results[f'{count} particles'] = time_frames(tick, frames)
+    return results
+
+
+@benchmark('audio')
+def bench_audio(frames: int) -> dict:
+    rng = np.random.default_rng(0)
+    walls = rng.random((64, 64)) < 0.05
+    grid = TileGrid({
+        gen_tile_key((x, y)): {'height': 1}
+        for x, y in zip(*np.nonzero(walls))
+    })
+    sound = pg.mixer.Sound(buffer=bytes(44100 * 4))
+    results = {}
+    for label, occlusion in (('', None), (' occluded', grid)):
+        audio = AudioEngine(16, capacity=128, grid=occlusion)
+        for pos in rng.uniform(0, 64, (128, 2)):
+            audio.play(sound, pos, loop=1)
+        listener = [32, 32]
+
+        def tick() -> None:
+            listener[0] += 0.05
+            audio.update(listener, 45)
+
+        results[f'128 voices{label}'] = time_frames(tick, frames)
+        audio.stop_all()
+    return results
+
+
+# bytes held by the subsystems at the sizes the benchmarks use
+def memory_report() -> MemoryReport:
+    rng = np.random.default_rng(0)
+    tilemap = {
+        gen_tile_key((x, y)): {
+            'elevation': 0,
+            'height': float(rng.random() < 0.2),
+            'top': (128, 128, 128),
+            'bottom': (64, 64, 64),
+        }
+        for x in range(64) for y in range(64)
+    }
+    grid = TileGrid(tilemap)
+    shades = ShadeTable(8)
+    floor = FloorCaster(SURF_SIZE, 90, SURF_SIZE[0] / 2, grid, shades)
+    surf = pg.Surface(SURF_SIZE)
+    floor.render(surf, (32, 32), (1, 0), 0.5, 0.5)
+    sprites = SpriteRenderer(SURF_SIZE, 90, SURF_SIZE[0] / 2, shades)
+    sprite = pg.Surface((32, 64))
+    sprites.draw(
+        surf,
+        [sprite] * 100,
+        rng.uniform(-8, 8, (100, 2)),
+        np.zeros(100),
+        np.full(100, 0.6),
+        (0, 0),
+        (1, 0),
+        0.5,
+        0.5,
+        np.full(SURF_SIZE[0], 8.0),
+    )
+    store = EntityStore(500)
+    spatial = SpatialHash()
+    for pos in rng.uniform(0, 64, (500, 2)):
+        spatial.insert(store.spawn(pos), pos)
+    particles = ParticleSystem(SURF_SIZE, 90, SURF_SIZE[0] / 2, shades)
+
+    report = MemoryReport()
+    for name, obj in (
+        ('tilemap', tilemap),
+        ('tile grid', grid),
+        ('shading', shades),
+        ('floor', floor),
+        ('sprites', sprites),
+        ('entities', store),
+        ('spatial', spatial),
+        ('projectiles', ProjectilePool()),
+        ('particles', particles),
+    ):
+        report.add(name, lambda obj=obj: obj)
+    return report
+
+
+# --memory prints the memory report after the benchmarks
+def main(names: list[str]) -> None:
+    pg.init()
+    memory = '--memory' in names
+    names = [name for name in names if name != '--memory']
+    if not names and not memory:
+        names = list(BENCHMARKS)
+    for name in names:
+        print(name)
+        for label, ms in BENCHMARKS[name](FRAMES).items():
+            print(f'    {label}: {ms:.3f} ms/frame')
+    if memory:
+        print('memory')
+        print(memory_report().format())
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
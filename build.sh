@@ -4,11 +4,22 @@
 # Setup
 DIR=$PWD
 MODULES=("pathfind" "camera")
+BUILD_ARGS=()
+
+# Profiling hooks (so cProfile captures see time spent in the modules)
+for arg in "$@"; do
+    case $arg in
+        -p|--profile)
+        BUILD_ARGS+=("--cython-directives=profile=True,linetrace=True")
+        export CFLAGS="$CFLAGS -DCYTHON_TRACE=1 -DCYTHON_TRACE_NOGIL=1"
+        ;;
+    esac
+done
 
 # Compile Cython Modules
 for module in "${MODULES[@]}"; do
     cd $DIR/ract/$module
-    python3 setup.py build_ext --build-lib=../
+    python3 setup.py build_ext --build-lib=../ "${BUILD_ARGS[@]}"
 done
 
 
@@ -0,0 +1,48 @@
+import os
+import sys
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+import json
+import argparse
+
+from systems.lighting import bake_tilemap
+from systems.lighting import gen_mark_lights
+
+# Bakes light into the darkness of every tile of a saved level
+# Every mark with the index given by --mark is a light
+# python3 bake.py ../data/maps/0.json --mark 6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='bake level lighting')
+    parser.add_argument('path')
+    parser.add_argument('-o', '--output', help='defaults to path')
+    parser.add_argument('-m', '--mark', type=int, default=6)
+    parser.add_argument('-a', '--ambient', type=float, default=1)
+    parser.add_argument('-e', '--elevation', type=float, default=0.5)
+    parser.add_argument('-i', '--intensity', type=float, default=1)
+    parser.add_argument('-r', '--radius', type=float, default=6)
+    parser.add_argument(
+        '-k', '--keep', action='store_true', help='keep authored darkness',
+    )
+    args = parser.parse_args()
+
+    with open(args.path, 'r') as file:
+        level = json.loads(file.read())
+    lights = gen_mark_lights(
+        level.get('marks', {}),
+        args.mark,
+        args.elevation,
+        args.intensity,
+        args.radius,
+    )
+    level['tilemap'] = bake_tilemap(
+        level['tilemap'], lights, ambient=args.ambient, keep=args.keep,
+    )
+    with open(args.output or args.path, 'w') as file:
+        json.dump(level, file)
+    print(f'baked {len(lights)} lights into {len(level["tilemap"])} tiles')
+
+
+if __name__ == '__main__':
+    main()
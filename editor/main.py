@@ -15,6 +15,10 @@ import pygame as pg
 from data.levels import LEVELS
 from ract.utils import FALLBACK_SURF
 from ract.utils import gen_tile_key
+from systems.lighting import bake_tilemap
+from systems.lighting import gen_mark_lights
+from systems.memory import MemoryReport
+from systems.text import TEXT
 
 from panel import Surface
 from panel import Label
@@ -84,6 +88,7 @@ class Game(object):
             # actual mark
             'marks': (pg.K_0, pg.K_1, pg.K_2, pg.K_3, pg.K_4, pg.K_5, pg.K_6),
             'clear': (pg.K_c, ),
+            'memory': (pg.K_F10, ), # prints the memory report
         }
         
         # Data
@@ -109,6 +114,9 @@ class Game(object):
         # TODO: ADD MARKERS
         # TODO: ADD THAT TO HISTORY
         
+        # marks with this index are lights when baking
+        self._light_mark = 6
+
         # tools
         self._tool = 'place' # place, remove, eyedropper, mark
         self._place_alpha = 128 # alpha of 'ghost' tile when placing
@@ -133,6 +141,14 @@ class Game(object):
         self._history = [copy.deepcopy(self._default_change)]
         self._change = 0
 
+        # Memory
+        self._memory = MemoryReport(boundaries=(self, ))
+        self._memory.add('history', lambda: self._history)
+        self._memory.add('level', lambda: self._dict)
+        self._memory.add('wall textures', lambda: self._wall_textures)
+        self._memory.add('fonts', lambda: self._fonts)
+        self._memory.add('text', lambda: TEXT)
+
     def _initialize_panel(self: Self) -> None:
         # difference in y between widgets is 20
 
@@ -419,6 +435,12 @@ class Game(object):
                     func=self._load,
                     font=self._fonts['main'],
                 ),
+                Button(
+                    (self._EDITOR_WIDTH + 110, 50),
+                    text='Bake',
+                    func=self._bake,
+                    font=self._fonts['main'],
+                ),
                 Label(
                     (self._EDITOR_WIDTH + 10, 90),
                     text='Level Index',
@@ -602,6 +624,19 @@ class Game(object):
         except:
             pass
 
+    # overwrites the darkness of every tile with baked light
+    def _bake(self: Self) -> None:
+        lights = gen_mark_lights(self._dict['marks'], self._light_mark)
+        if not lights:
+            # baking nothing would set every tile to the ambient darkness
+            return
+        old = self._dict # don't need copy because using =
+        self._dict = {
+            'tilemap': bake_tilemap(self._dict['tilemap'], lights),
+            'marks': self._dict['marks'],
+        }
+        self._load_change(old)
+
     def _load_level(self: Self) -> None:
         try:
             self._level = LEVELS[int(self._widgets['level'].text)]
@@ -975,6 +1010,8 @@ class Game(object):
                                 self._tool = 'eyedropper'
                             elif event.key in self._keys['mark']:
                                 self._tool = 'mark'
+                            elif event.key in self._keys['memory']:
+                                print(self._memory.format())
                         # Height / Elevation
                         if event.key in self._keys['vertical_increase']:
                             if mod:
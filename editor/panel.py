@@ -7,6 +7,8 @@ import pygame as pg
 from pygame.typing import Point
 from pygame.typing import ColorLike
 
+from systems.text import TEXT
+
 
 # If _rect is set by child class, child class should make sure
 # it takes scroll into account
@@ -77,7 +79,8 @@ class Label(_Widget):
     @text.setter
     def text(self: Self, value: str) -> None:
         self._text = value
-        self._surf = self._font.render(
+        self._surf = TEXT.render(
+            self._font,
             value,
             1,
             (255, 255, 255),
@@ -111,7 +114,7 @@ class Button(_Widget): # Text Button
     @text.setter
     def text(self: Self, value: str) -> None:
         self._text = value
-        text = self._font.render(value, 1, (255, 255, 255))
+        text = TEXT.render(self._font, value, 1, (255, 255, 255))
         self._rect = pg.Rect(self._pos, text.size)
         self._rect.y = self._pos[1] + self._scroll
         
@@ -178,7 +181,7 @@ class Toggle(_Widget):
     @text.setter
     def text(self: Self, value: str) -> None:
         self._text = value
-        text = self._font.render(value, 1, (255, 255, 255))
+        text = TEXT.render(self._font, value, 1, (255, 255, 255))
         self._rect = pg.Rect(self._pos, text.size)
         self._rect.y = self._pos[1] + self._scroll
         
@@ -242,7 +245,7 @@ class Input(_Widget): # Text Input
     def surf(self: Self) -> None:
         surf = self._surf.copy()
         if self._focused:
-            width = self._font.size(self._text[:self._cursor_pos])[0]
+            width = TEXT.size(self._font, self._text[:self._cursor_pos])[0]
             pg.draw.rect(surf, (255, 255, 255), (width, 0, 1, self._height))
         return surf
 
@@ -254,7 +257,7 @@ class Input(_Widget): # Text Input
     def text(self: Self, value: str) -> None:
         self._text = value[:self._max_chars]
         self._cursor_pos = min(self._cursor_pos, len(value))
-        text = self._font.render(self._text, 1, (255, 255, 255))
+        text = TEXT.render(self._font, self._text, 1, (255, 255, 255))
         self._surf = pg.Surface((self._width, self._height))
         self._surf.blit(text, (0, 0))
         pg.draw.rect(
@@ -288,7 +291,7 @@ class Input(_Widget): # Text Input
                 x = event.pos[0] - self._pos[0]
                 old = 0 # last width calculated
                 for dex in range(len(self._text) + 1):
-                    width = self._font.size(self._text[:dex])[0]
+                    width = TEXT.size(self._font, self._text[:dex])[0]
                     if old <= x < width:
                         # past middle it will go to dex
                         # before middile it will go to dex - 1
@@ -1,11 +1,17 @@
+import os
 import time
 import math
 import json
+import copy
 import random
 from numbers import Real
 from typing import Self
+from typing import Optional
+from typing import Generator
 
+import numpy as np
 import pygame as pg
+from pygame.typing import Point
 
 from data.weapons import SOUNDS
 from data.weapons import WEAPONS
@@ -13,14 +19,45 @@ from data.levels import LEVELS
 from data.levels import TEST
 from data.levels import ENEMY
 from ract.camera import Camera
-from ract.hud import HUDElement
-from ract.hud import HUD
 from ract.menu import Menu
 from ract.pathfind import Pathfinder
 from ract.utils import EPSILON
 from ract.utils import gen_tile_key
 from ract.utils import gen_fnt_path
 from ract.utils import gen_img_path
+from systems.tiles import TileGrid
+from systems.shading import ShadeTable
+from systems.floor import FloorCaster
+from systems.lighting import LightGrid
+from systems.spatial import SpatialHash
+from systems.collision import SubStepper
+from systems.platforms import PlatformMover
+from systems.activity import ActivityMonitor
+from systems.scheduler import Scheduler
+from systems.paths import PathFollower
+from systems.input import InputMap
+from systems.memory import GCScheduler
+from systems.memory import AllocationTracker
+from systems.memory import MemoryReport
+from systems.profiler import Profiler
+from systems.audio import AudioEngine
+from systems.audio import RoutedSounds
+from systems.hud import RetainedHUD
+from systems.hud import text_renderer
+from systems.text import TEXT
+from systems.saves import SAVE_VERSION
+from systems.saves import SaveWriter
+from systems.saves import apply_delta
+from systems.saves import load_snapshot
+from systems.saves import tilemap_delta
+from systems.sprites import SpriteRenderer
+from systems.particles import ParticleSystem
+from systems.entities import EntityStore
+from systems.raycast import cast_rays
+from systems.hitscan import hitscan
+from systems.hitscan import gen_spread
+from systems.raycast import gen_plane
+from systems.raycast import gen_column_dirs
 
 PATHFINDER = Pathfinder(
     TEST._manager._level._walls._tilemap,
@@ -50,6 +87,30 @@ class Game(object):
                 'multithreaded': 1,
                 'fov': 90,
                 'render_distance': 8,
+                'floor_casting': 1,
+            },
+            'memory': {
+                'gc_scheduling': 1, # collect in frame slack while playing
+                'gc_budget': 1, # ms
+                'frame_time': 1000 / 60, # ms the slack is measured against
+                'track_allocations': 0, # prints a report on quit
+                'report_key': pg.K_F10, # prints bytes held per subsystem
+            },
+            'profiling': {
+                'key': pg.K_F9, # starts / stops a capture
+                'frames': 300,
+                'mode': 'sample', # or 'cprofile'
+                'directory': 'profiles',
+            },
+            'audio': {
+                'channels': 16, # mixer channels positional sounds play on
+                'max_distance': 16, # sounds further away are culled
+                'occlusion': 1, # muffle sounds behind walls
+            },
+            'saves': {
+                'quicksave_key': pg.K_F5,
+                'quickload_key': pg.K_F8,
+                'path': os.path.join('saves', 'quicksave.sav'),
             },
             'keys': {
                 'interact': pg.K_e,
@@ -74,6 +135,11 @@ class Game(object):
             vsync=self._settings['graphics']['vsync']
         )
         pg.display.set_caption('Computergenesis')
+        self._input = InputMap(self._settings['keys'])
+        self._gc = GCScheduler(self._settings['memory']['gc_budget'])
+        self._allocations = AllocationTracker()
+        self._profiler = Profiler(self._settings['profiling']['directory'])
+        self._memory = MemoryReport(boundaries=(self, ))
         self._surface = pg.Surface(self._SURF_SIZE)
         self._running = 0
         
@@ -82,7 +148,6 @@ class Game(object):
         
         # Level
         self._level = LEVELS[0]
-        self._level.sounds = SOUNDS # in levels.py SOUNDS._manager gets changed
         self._player = self._level.entities.player
         self._player.weapon = WEAPONS['launcher']
         
@@ -99,6 +164,143 @@ class Game(object):
         self._camera.camera_offset = 5 / 6 * self._player.height
         self._camera.weapon_scale = 3 / self._SURF_RATIO[0]
 
+        # Floor / Ceiling
+        self._grid = TileGrid(self._level.walls.tilemap)
+        # saves only store tiles that differ from this
+        self._pristine = copy.deepcopy(self._level.walls.tilemap)
+        self._shades = ShadeTable(
+            self._settings['graphics']['render_distance'],
+        )
+        self._floor = FloorCaster(
+            self._SURF_SIZE,
+            fov=self._settings['graphics']['fov'],
+            tile_size=self._SURF_SIZE[0] / 2,
+            grid=self._grid,
+            shades=self._shades,
+        )
+
+        # Sprites
+        self._sprites = SpriteRenderer(
+            self._SURF_SIZE,
+            fov=self._settings['graphics']['fov'],
+            tile_size=self._SURF_SIZE[0] / 2,
+            shades=self._shades,
+        )
+        self._plane = gen_plane(
+            self._SURF_SIZE[0], self._settings['graphics']['fov'],
+        )
+        self._sprite_images = {
+            TEST: self._load_sprite('test.png'),
+            ENEMY: self._load_sprite('enemy.png'),
+        }
+        for entity, sprite in self._sprite_images.items():
+            self._sprites.add(entity, sprite)
+
+        # Particles
+        self._particles = ParticleSystem(
+            self._SURF_SIZE,
+            fov=self._settings['graphics']['fov'],
+            tile_size=self._SURF_SIZE[0] / 2,
+            shades=self._shades,
+        )
+        # weapon: (reach, pellets, spread, emit kwargs) of a hitscan shot
+        # and the sparks where each of its pellets lands
+        self._impacts = {
+            WEAPONS['fist']: (
+                1, 1, 0, {'count': 6, 'color': (200, 200, 200)},
+            ),
+            WEAPONS['shotgun']: (
+                self._settings['graphics']['render_distance'],
+                8,
+                12,
+                {'count': 3, 'color': (255, 200, 80)},
+            ),
+        }
+
+        # Lighting
+        self._lights = LightGrid(self._grid)
+        self._muzzle_flashes = {
+            WEAPONS['shotgun']: {'radius': 4, 'intensity': 1, 'duration': 6},
+            WEAPONS['launcher']: {
+                'radius': 3, 'intensity': 0.75, 'duration': 8,
+            },
+        }
+
+        # Positional audio
+        audio = self._settings['audio']
+        self._audio = AudioEngine(
+            audio['channels'],
+            max_distance=audio['max_distance'],
+            grid=self._grid if audio['occlusion'] else None,
+        )
+        # the level's positional sounds are mixed by the audio engine
+        self._level.sounds = RoutedSounds(SOUNDS, self._audio)
+
+        # The level's enemies
+        self._enemies = [TEST, ENEMY]
+
+        # Entity index (interaction, melee, crowd lookups)
+        self._spatial = SpatialHash()
+        self._spatial.insert(self._player, self._player.pos, ('player', ))
+        for enemy in self._enemies:
+            self._spatial.insert(enemy, enemy.pos, ('enemy', ))
+        self._platforms = PlatformMover(self._grid, self._spatial)
+
+        # Sleep / wake and AI tick rates
+        self._activity = ActivityMonitor()
+        for enemy in self._enemies:
+            self._activity.add(enemy)
+
+        # the engine's bodies mirrored in an entity store, their moves are
+        # swept through the grid after the engine updates them so fast ones
+        # can't skip thin walls
+        self._bodies = EntityStore(4)
+        self._mirrors = {
+            body: self._bodies.spawn(body.pos, body.elevation, body.height)
+            for body in (self._player, *self._enemies)
+        }
+        self._noise_radius = 16 # enemies in range of a shot wake up
+        # tiles around the player interact() may edit
+        self._interact_reach = 2
+        # entity: ticks since it last thought, kept until its think task
+        # gets a turn
+        self._thinking = {}
+
+        # AI work is time sliced to this many ms per frame
+        self._scheduler = Scheduler(budget=2)
+        self._followers = PathFollower()
+        # entity: path being planned, one piece of path_nodes per turn
+        self._plans = {}
+        self._path_nodes = 25
+        self._path_pieces = 4
+
+        # Memory report (anything reachable from a subsystem that isn't
+        # another subsystem counts as its own)
+        self._memory.add('walls', lambda: self._level.walls.tilemap)
+        self._memory.add(
+            'wall textures', lambda: self._level._walls._textures,
+        )
+        self._memory.add('entities', lambda: self._level.entities)
+        self._memory.add('weapons', lambda: WEAPONS)
+        self._memory.add('sounds', lambda: SOUNDS)
+        self._memory.add('fonts', lambda: self._fonts)
+        self._memory.add('pathfinder', lambda: PATHFINDER)
+        self._memory.add('tile grid', lambda: self._grid)
+        self._memory.add('shading', lambda: self._shades)
+        self._memory.add('floor', lambda: self._floor)
+        self._memory.add('sprites', lambda: self._sprites)
+        self._memory.add('particles', lambda: self._particles)
+        self._memory.add('lights', lambda: self._lights)
+        self._memory.add('spatial', lambda: self._spatial)
+        self._memory.add('profiler', lambda: self._profiler)
+        self._memory.add('audio', lambda: self._audio)
+        self._memory.add_boundary(self._level)
+        self._memory.add_boundary(self._camera)
+
+        # Saves
+        self._saves = SaveWriter()
+        self._saved_entities = {'test': TEST, 'enemy': ENEMY}
+
         # Menu
         self._fonts = {
             'normal': [
@@ -130,6 +332,35 @@ class Game(object):
             'pause': None,
             'last': None, # last menu selected
         }
+        # HUD
+        self._fps = 0
+        self._weapon_names = {weapon: name for name, weapon in WEAPONS.items()}
+        self._hud = RetainedHUD(self._SURF_SIZE)
+        crosshair = pg.Surface((5, 5), pg.SRCALPHA)
+        pg.draw.line(crosshair, (255, 255, 255), (2, 0), (2, 4))
+        pg.draw.line(crosshair, (255, 255, 255), (0, 2), (4, 2))
+        self._hud.static(
+            'crosshair',
+            crosshair,
+            (self._SURF_SIZE[0] // 2, self._SURF_SIZE[1] // 2),
+            'center',
+        )
+        self._hud.dynamic(
+            'fps',
+            lambda: int(self._fps),
+            text_renderer(self._fonts['normal'][0], fmt='{} FPS'),
+            (4, 4),
+        )
+        self._hud.dynamic(
+            'weapon',
+            lambda: self._weapon_names.get(self._player.weapon, ''),
+            text_renderer(self._fonts['bold'][0]),
+            (4, self._SURF_SIZE[1] - 4),
+            'bottomleft',
+        )
+        self._memory.add('hud', lambda: self._hud)
+        self._memory.add('text', lambda: TEXT)
+
         # main, credits, settings, pause, playing
         self._state = 'main'
         self._menus['main'].selected = 0
@@ -148,20 +379,25 @@ class Game(object):
         self._walk_speed = 0.0675
         self._walk_friction = 0.90625
         self._jump_velocity = 0.075
+        # splits the player's fast frames so it never skips a tile
+        self._stepper = SubStepper()
         self._key_look_speed = 2.5
         self._mouse_look_speed = 0.2
 
     def move_tiles(self: Self, level_timer: Real) -> None:
-        self._level.walls.set_tile(
-            pos=(8, 11),
+        self._platforms.move(
+            self._level.walls,
+            (8, 11),
             elevation=math.sin(level_timer / 60 + math.pi) + 1,
         )
-        self._level.walls.set_tile(
-            pos=(9, 11),
+        self._platforms.move(
+            self._level.walls,
+            (9, 11),
             height=math.sin(level_timer / 60) + 1,
         )
-        self._level.walls.set_tile(
-            pos=(10, 8),
+        self._platforms.move(
+            self._level.walls,
+            (10, 8),
             elevation=0,
             height=2,
             texture=0,
@@ -172,6 +408,215 @@ class Game(object):
             },
             rect=(0.2, 0, 0.0001, 1),
         )
+        self._platforms.carry()
+
+    def _get_entity_state(self: Self, entity: object) -> dict:
+        state = {
+            'pos': [entity.pos[0], entity.pos[1]],
+            'velocity': [entity.velocity2[0], entity.velocity2[1]],
+            'elevation': entity.elevation,
+            'elevation_velocity': entity.elevation_velocity,
+            'height': entity.height,
+            'yaw': entity.yaw,
+        }
+        if hasattr(entity, 'state'):
+            state['state'] = entity.state
+        return state
+
+    def _set_entity_state(self: Self, entity: object, state: dict) -> None:
+        entity.pos = state['pos']
+        entity.velocity2 = state['velocity']
+        entity.elevation = state['elevation']
+        entity.elevation_velocity = state['elevation_velocity']
+        entity.height = state['height']
+        entity.yaw = state['yaw']
+        if 'state' in state:
+            entity.state = state['state']
+
+    # the engine's interact() edits tiles without telling the grid, so the
+    # tiles in reach are updated (which also marks them changed for saves)
+    def _interact(self: Self) -> None:
+        self._player.interact()
+        x = math.floor(self._player.pos[0])
+        y = math.floor(self._player.pos[1])
+        reach = self._interact_reach
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                self._grid.update((x + dx, y + dy))
+
+    # copies only plain values and changed tiles, the writer thread does
+    # the encoding, compression and disk work
+    def _quicksave(self: Self, level_timer: Real) -> None:
+        player = self._get_entity_state(self._player)
+        player['weapon'] = next(
+            (
+                name for name, weapon in WEAPONS.items()
+                if weapon is self._player.weapon
+            ),
+            None,
+        )
+        self._saves.save(self._settings['saves']['path'], {
+            'version': SAVE_VERSION,
+            'level': LEVELS.index(self._level),
+            'level_timer': level_timer,
+            'player': player,
+            'entities': {
+                name: self._get_entity_state(entity)
+                for name, entity in self._saved_entities.items()
+            },
+            'tiles': tilemap_delta(self._pristine, self._grid),
+        })
+
+    # returns the saved level timer (None if there is nothing to load)
+    def _quickload(self: Self) -> Optional[Real]:
+        self._saves.flush()
+        snapshot = load_snapshot(self._settings['saves']['path'])
+        if (snapshot is None
+            or LEVELS.index(self._level) != snapshot['level']):
+            return None
+        apply_delta(
+            self._pristine, snapshot['tiles'], self._level.walls, self._grid,
+        )
+        self._set_entity_state(self._player, snapshot['player'])
+        weapon = WEAPONS.get(snapshot['player']['weapon'])
+        if weapon is not None:
+            self._player.weapon = weapon
+        for name, state in snapshot['entities'].items():
+            entity = self._saved_entities[name]
+            self._set_entity_state(entity, state)
+            self._followers.stop(entity)
+            self._plans.pop(entity, None)
+            self._thinking.pop(entity, None)
+        self._particles.clear()
+        self._lights.clear()
+        self._audio.stop_all()
+        self._spatial.sync()
+        return snapshot['level_timer']
+
+    def _toggle_profiler(self: Self) -> None:
+        profiling = self._settings['profiling']
+        if self._profiler.capturing:
+            print('profile written to', *self._profiler.stop())
+        else:
+            self._profiler.start(profiling['frames'], profiling['mode'])
+
+    # standing on top of the tile at pos
+    def _on_top(self: Self, pos: Point, elevation: Real) -> bool:
+        data = self._level.walls.tilemap.get(gen_tile_key(pos))
+        if data is None:
+            return 0
+        return elevation >= data['height'] + data['elevation']
+
+    # entity's think task plans the path (the lookups are cheap so they are
+    # done right away)
+    def _request_path(self: Self, entity: object) -> None:
+        self._plans[entity] = self._plan_path(
+            entity,
+            (entity.tile, self._on_top(entity.pos, entity.elevation)),
+            (
+                self._player.tile,
+                self._on_top(self._player.pos, self._player.elevation),
+            ),
+        )
+
+    # plans up to path_pieces pieces of at most path_nodes nodes, one per
+    # resume, every piece starts where the last was cut short by the node
+    # limit and is followed as soon as it is found
+    def _plan_path(self: Self,
+                   entity: object,
+                   start: tuple,
+                   goal: tuple) -> Generator:
+        for piece in range(self._path_pieces):
+            path = tuple(PATHFINDER.pathfind(
+                entity.yaw, start, goal, max_nodes=self._path_nodes,
+            ))
+            if not path:
+                return
+            reached = tuple(path[0][0]) == tuple(goal[0])
+            if piece:
+                # goal first, so the rest of the route goes in front
+                path += self._followers.remaining(entity)
+            # a first piece that was cut short can still join the route
+            # the entity is already on
+            self._followers.follow(
+                entity, path, splice=not piece and not reached,
+            )
+            if reached:
+                return
+            start = path[0]
+            yield
+
+    # one entity's thinking, steering whenever it has thought since its
+    # last turn and one piece of its path plan per turn
+    def _think(self: Self, entity: object) -> Generator:
+        while 1:
+            elapsed = self._thinking.pop(entity, None)
+            if elapsed is not None:
+                self._followers.update(self._grid, {entity: elapsed})
+            plan = self._plans.get(entity)
+            if plan is not None:
+                try:
+                    next(plan)
+                except StopIteration:
+                    del self._plans[entity]
+            yield
+
+    # every pellet of the player's hitscan shot in one pass, sparks where
+    # each lands and the enemies it struck are alerted
+    def _shoot(self: Self) -> None:
+        impact = self._impacts.get(self._player.weapon)
+        if impact is None:
+            return
+        reach, pellets, spread, kwargs = impact
+        eye = self._player.elevation + self._camera.camera_offset
+        yaws = gen_spread(self._player.yaw, pellets, spread)
+        shot = hitscan(
+            self._grid,
+            self._player.pos,
+            eye,
+            yaws,
+            reach,
+            spatial=self._spatial,
+            tags=('enemy', ),
+            exclude=self._player,
+        )
+        radians = np.radians(yaws)
+        for pellet in np.flatnonzero(shot['hit']):
+            distance = shot['distances'][pellet] - 0.05
+            self._particles.emit(
+                (
+                    self._player.pos[0] + math.cos(radians[pellet]) * distance,
+                    self._player.pos[1] + math.sin(radians[pellet]) * distance,
+                ),
+                eye,
+                yaw=yaws[pellet] + 180,
+                spread=120,
+                **kwargs,
+            )
+        for enemy in shot['targets']:
+            self._activity.alert(enemy)
+
+    # a missing sprite raises instead of drawing a placeholder
+    def _load_sprite(self: Self, name: str) -> pg.Surface:
+        surf = pg.image.load(gen_img_path(name)).convert()
+        surf.set_colorkey((255, 0, 255))
+        return surf
+
+    # sprites of entities that died are dropped
+    def _prune_sprites(self: Self) -> None:
+        for entity in list(self._sprites.entities):
+            if not getattr(entity, 'alive', 1):
+                self._sprites.remove(entity)
+
+    # per column wall distance for everything drawn over the walls
+    def _get_depth(self: Self, eye: Real) -> np.ndarray:
+        return cast_rays(
+            self._grid,
+            self._player.pos,
+            gen_column_dirs(self._player.forward, self._plane),
+            self._settings['graphics']['render_distance'],
+            z=eye,
+        )[1]
 
     def _update_crouch_height(self: Self, crouching: Real) -> None:
         self._player.height = self._player.try_height(
@@ -224,12 +669,9 @@ class Game(object):
         start_time = time.time()
         level_timer = 0
         
-        # Keys
-        keys = pg.key.get_pressed()
-
         from statistics import mean
         frames = []
-        fps = 0
+        self._fps = 0
         second = pg.event.custom_type()
         pg.time.set_timer(second, 1000)
         
@@ -241,8 +683,13 @@ class Game(object):
         # ENEMY
         ENEMY.state = 'stalking'
 
-        # PATH
-        path = []
+        # AI
+        for index, enemy in enumerate(self._enemies):
+            self._scheduler.spawn(self._think(enemy), f'think enemy {index}')
+
+        # Memory
+        if self._settings['memory']['track_allocations']:
+            self._allocations.start()
 
         while self._running:
             # Time
@@ -250,25 +697,51 @@ class Game(object):
             start_time = time.time()
             rel_game_speed = delta_time * self._GAME_SPEED
             level_timer += rel_game_speed
+            self._profiler.frame()
+
+            # Keys
+            self._profiler.phase('events')
+            self._input.poll()
 
             # Events
             for event in pg.event.get():
                 if event.type == pg.QUIT:
                     self._running = 0
                 elif self._state == 'playing':
-                    if event.type == pg.MOUSEMOTION:
-                        rel = pg.mouse.get_rel()
-                        self._player.yaw += rel[0] * self._mouse_look_speed
-                        # self._camera.horizon -= rel[1] * 0.0025
-                    elif event.type == pg.MOUSEBUTTONDOWN:
+                    if event.type == pg.MOUSEBUTTONDOWN:
                         self._player.attack()
+                        flash = self._muzzle_flashes.get(self._player.weapon)
+                        if flash is not None:
+                            self._lights.add(self._player.pos, **flash)
+                        # the launcher's rockets are the engine's
+                        # projectiles so it has no hitscan here
+                        self._shoot()
+                        for enemy in self._spatial.query_radius(
+                            self._player.pos,
+                            self._noise_radius,
+                            tags=('enemy', ),
+                        ):
+                            self._activity.alert(enemy)
                     elif event.type == second:
-                        fps = mean(frames)
-                        pg.display.set_caption(str(int(fps)))
+                        self._fps = mean(frames)
+                        pg.display.set_caption(str(int(self._fps)))
                         frames = []
                     elif event.type == pg.KEYDOWN:
                         # TEMP
-                        if event.key == pg.K_1:
+                        if event.key == self._settings['profiling']['key']:
+                            self._toggle_profiler()
+                        elif (event.key
+                              == self._settings['memory']['report_key']):
+                            print(self._memory.format())
+                        elif (event.key
+                              == self._settings['saves']['quicksave_key']):
+                            self._quicksave(level_timer)
+                        elif (event.key
+                              == self._settings['saves']['quickload_key']):
+                            loaded = self._quickload()
+                            if loaded is not None:
+                                level_timer = loaded
+                        elif event.key == pg.K_1:
                             self._player.weapon = WEAPONS['fist']
                         elif event.key == pg.K_2:
                             self._player.weapon = WEAPONS['shotgun']
@@ -276,34 +749,15 @@ class Game(object):
                             self._player.weapon = WEAPONS['launcher']
                         elif event.key == pg.K_0:
                             # sSOUNDS['water'].play(pos=(9, 0.25, 9)) 
-                            data = self._level.walls.tilemap.get(gen_tile_key(self._player.pos))
-                            if data is not None:
-                                elevation = self._player.elevation >= data['height'] + data['elevation']
-                            else:
-                                elevation = 0
-                            data = self._level.walls.tilemap.get(gen_tile_key(TEST.pos))
-                            if data is not None:
-                                test_elevation = TEST.elevation >= data['height'] + data['elevation']
-                            else:
-                                test_elevation = 0
-                            start = time.time()
-                            path = PATHFINDER.pathfind(
-                                TEST.yaw,
-                                (TEST.tile, test_elevation),
-                                (self._player.tile, elevation),
-                                max_nodes=100,
-                            )
-                            print(time.time() - start)
-                        elif event.key == self._settings['keys']['interact']:
-                            self._player.interact()
+                            self._activity.alert(TEST)
+                            self._request_path(TEST)
+                        elif self._input.matches(event.key, 'interact'):
+                            self._interact()
                         elif not sliding:
-                            if (event.key == self._settings['keys']['slide']
+                            if (self._input.matches(event.key, 'slide')
                                 and jumping):
                                 sliding = EPSILON
-                                mult = (
-                                    keys[self._settings['keys']['forward']]
-                                    - keys[self._settings['keys']['backward']]
-                                )
+                                mult = self._input.axis('forward', 'backward')
                                 self._player.boost = (
                                     self._player.forward
                                     * self._slide_speed
@@ -312,39 +766,31 @@ class Game(object):
                                 self._player.elevation_velocity = (
                                     self._slide_elevation_velocity
                                 )
-                            elif (event.key == self._settings['keys']['crouch']
+                            elif (self._input.matches(event.key, 'crouch')
                                   and not jumping
                                   and not crouching):
                                 crouching = EPSILON
                 elif event.type == pg.KEYDOWN:
                     menu = self._menus[self._state]
-                    if event.key == self._settings['keys']['menu_up']:
+                    if self._input.matches(event.key, 'menu_up'):
                         menu.selected -= 1
-                    elif event.key == self._settings['keys']['menu_down']:
+                    elif self._input.matches(event.key, 'menu_down'):
                         menu.selected += 1
-                    elif event.key == self._settings['keys']['menu_enter']:
+                    elif self._input.matches(event.key, 'menu_enter'):
                         menu.enter()
             
             if self._state == 'playing':
-                if path:
-                    if path[-1][1]:
-                        data = self._level.walls.tilemap[gen_tile_key(path[-1][0])]
-                        TEST.elevation_velocity = (data['elevation'] + data['height'] - TEST.elevation) * 0.25
-                    else:
-                        TEST.elevation_velocity = -0.1
-                    vector = -(pg.Vector2(TEST.pos) - path[-1][0] - (0.5, 0.5))
-                    if vector:
-                        TEST.velocity2 = vector.normalize() * 0.1
-                    if len(path) == 1:
-                        TEST.velocity2 = vector * 0.075
-                    if (pg.Vector2(TEST.pos) - path[-1][0] - (0.5, 0.5)).magnitude() < 0.1:
-                        path = path[:-1]
-                    if not path:
-                        TEST.velocity2 = (0, 0)
-
-                # Keys
-                keys = pg.key.get_pressed()
-                
+                self._profiler.phase('ai')
+                # thinking that didn't get a turn adds up for the next
+                for entity, elapsed in self._activity.update(
+                    self._player.pos, rel_game_speed,
+                ).items():
+                    self._thinking[entity] = (
+                        self._thinking.get(entity, 0) + elapsed
+                    )
+                self._scheduler.run()
+
+                self._profiler.phase('update')
                 # Update
                 if self._level is LEVELS[0]:
                     self.move_tiles(level_timer)
@@ -363,7 +809,7 @@ class Game(object):
                         if not jumping:
                             crouching = EPSILON
                 if crouching:
-                    if keys[self._settings['keys']['crouch']]:
+                    if self._input.held('crouch'):
                         crouching = min(
                             crouching + rel_game_speed, self._crouch_time,
                         )
@@ -382,45 +828,131 @@ class Game(object):
                 )
                 
                 movement = (
-                    (keys[self._settings['keys']['forward']]
-                     - keys[self._settings['keys']['backward']])
+                    self._input.axis('forward', 'backward')
                     * speed, # FORWARD BACKWARD
-                    (keys[self._settings['keys']['right']]
-                     - keys[self._settings['keys']['left']])
+                    self._input.axis('right', 'left')
                     * speed, # LEFT RIGHT
-                    (keys[self._settings['keys']['look_right']]
-                     - keys[self._settings['keys']['look_left']])
+                    self._input.axis('look_right', 'look_left')
                     * self._key_look_speed, # LOOK LEFT RIGHT
-                    (keys[self._settings['keys']['jump']] and not jumping)
+                    (self._input.held('jump') and not jumping)
                     * self._jump_velocity, # JUMP
                 )
-                self._player.update(
+                self._bodies.pull(self._mirrors)
+                old_pos = self._bodies.pos.copy()
+                old_elevation = self._bodies.elevation.copy()
+                steps, rel_step = self._stepper.split(
                     rel_game_speed,
-                    level_timer,
-                    movement[0],
-                    movement[1],
-                    movement[2],
-                    movement[3] if movement[3] else None,
+                    self._player.velocity2.magnitude()
+                    + abs(self._player.elevation_velocity),
+                )
+                for step in range(steps):
+                    self._player.update(
+                        rel_step,
+                        level_timer,
+                        movement[0],
+                        movement[1],
+                        movement[2],
+                        movement[3] if movement[3] and not step else None,
+                    )
+                self._level.update(rel_game_speed, level_timer)
+                self._bodies.pull(self._mirrors)
+                self._bodies.sweep(
+                    self._grid, self._mirrors, old_pos, old_elevation,
                 )
 
-                if keys[self._settings['keys']['jump']]:
+                if self._input.held('jump'):
                     jumping = 1
                 if self._player.collisions['e'][0]:
                     jumping = 0
 
-                self._level.update(rel_game_speed, level_timer)
+                self._particles.update(rel_game_speed, self._grid)
+                self._spatial.sync()
+                self._prune_sprites()
+                self._lights.update(rel_game_speed)
+                self._audio.update(
+                    self._player.pos,
+                    self._player.yaw,
+                    self._player.elevation + self._camera.camera_offset,
+                )
                 frames.append(1 / delta_time if delta_time else math.inf)
 
                 # Render
+                self._profiler.phase('render')
+                # mouse look is sampled as late as possible
+                rel = self._input.look()
+                self._player.yaw += rel[0] * self._mouse_look_speed
+                # self._camera.horizon -= rel[1] * 0.0025
+                eye = self._player.elevation + self._camera.camera_offset
+                if self._settings['graphics']['floor_casting']:
+                    self._floor.render(
+                        self._surface,
+                        self._player.pos,
+                        self._player.forward,
+                        eye,
+                        self._camera.horizon,
+                        lights=self._lights,
+                    )
                 self._camera.render(self._surface)
-                # self._hud.render(self._surface)
+                if self._sprites.entities or self._particles.count:
+                    depth = self._get_depth(eye)
+                    self._sprites.render(
+                        self._surface,
+                        self._player.pos,
+                        self._player.forward,
+                        eye,
+                        self._camera.horizon,
+                        depth,
+                        lights=self._lights,
+                    )
+                    self._particles.render(
+                        self._surface,
+                        self._player.pos,
+                        self._player.forward,
+                        eye,
+                        self._camera.horizon,
+                        depth,
+                        lights=self._lights,
+                    )
+                self._hud.update()
+                self._hud.render(self._surface)
             else:
+                self._input.look() # drop menu mouse motion
                 self._menus[self._state].render(self._surface)
 
+            self._profiler.phase('present')
             resized_surf = pg.transform.scale(self._surface, self._SCREEN_SIZE)
             self._screen.blit(resized_surf, (0, 0))
+
+            # Memory
+            memory = self._settings['memory']
+            if (memory['gc_scheduling']
+                and self._state == 'playing') != self._gc.enabled:
+                if self._gc.enabled:
+                    self._gc.disable()
+                else:
+                    self._gc.enable()
+            self._gc.budget = memory['gc_budget']
+            self._gc.collect(
+                memory['frame_time'] - (time.time() - start_time) * 1000,
+            )
+            self._allocations.frame()
+
+            # Saves (written on another thread, failures are only reported)
+            errors = self._saves.errors
+            while errors:
+                print(f'quicksave failed: {errors.pop(0)}')
+
             pg.display.flip()
-        
+
+        self._profiler.stop()
+        self._audio.stop_all()
+        self._saves.close()
+        for error in self._saves.errors:
+            print(f'quicksave failed: {error}')
+        self._gc.disable()
+        if self._allocations.tracking:
+            print(self._allocations.format_report())
+            self._allocations.stop()
         pg.quit()
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+from pygame.typing import Point
+
+
+# Decides which entities think this tick
+# Entities sleep until the player comes within wake_radius or enters their
+# region (left, top, width, height), or until they are alerted
+# Awake entities think every N ticks depending on their distance to the
+# player, spread over N staggered buckets so far entities don't all think
+# on the same tick
+# sleep_radius (if given) puts entities back to sleep when the player is
+# that far away and they are not alerted
+class ActivityMonitor(object):
+    def __init__(self: Self,
+                 wake_radius: Real=12,
+                 sleep_radius: Optional[Real]=None,
+                 lod: tuple=((8, 1), (16, 2), (32, 4)),
+                 far_interval: int=8,
+                 alert_time: Real=300) -> None:
+
+        self._wake_radius = wake_radius
+        self._sleep_radius = sleep_radius
+        # (up to distance, think every n ticks)
+        self._lod = tuple(sorted(lod))
+        self._far_interval = far_interval
+        self._alert_time = alert_time
+        # entity: [region, bucket, awake, alert timer, elapsed]
+        self._entities = {}
+        self._next_bucket = 0
+        self._tick = 0
+
+    @property
+    def entities(self: Self) -> list:
+        return list(self._entities)
+
+    @property
+    def tick(self: Self) -> int:
+        return self._tick
+
+    @property
+    def awake(self: Self) -> list:
+        return [
+            entity for entity, data in self._entities.items() if data[2]
+        ]
+
+    def add(self: Self,
+            entity: object,
+            region: Optional[tuple]=None,
+            awake: bool=0) -> None:
+        self._entities[entity] = [region, self._next_bucket, awake, 0, 0]
+        self._next_bucket += 1
+
+    def remove(self: Self, entity: object) -> None:
+        self._entities.pop(entity, None)
+
+    def is_awake(self: Self, entity: object) -> bool:
+        return bool(self._entities[entity][2])
+
+    # wakes an entity (heard a shot, got hit) and keeps it awake
+    # for alert_time ticks regardless of distance
+    def alert(self: Self, entity: object) -> None:
+        data = self._entities.get(entity)
+        if data is not None:
+            data[2] = 1
+            data[3] = self._alert_time
+
+    def interval(self: Self, distance: Real) -> int:
+        for limit, every in self._lod:
+            if distance <= limit:
+                return every
+        return self._far_interval
+
+    # returns {entity: ticks since it last thought} for the entities that
+    # think this tick
+    def update(self: Self, pos: Point, rel_game_speed: Real=1) -> dict:
+        self._tick += 1
+        if not self._entities:
+            return {}
+        entities = list(self._entities)
+        records = list(self._entities.values())
+        positions = np.array([entity.pos for entity in entities])
+        distances = np.hypot(
+            positions[:, 0] - pos[0], positions[:, 1] - pos[1],
+        )
+        thinking = {}
+        for entity, data, distance in zip(entities, records, distances):
+            if data[3] > 0:
+                data[3] = max(data[3] - rel_game_speed, 0)
+            if not data[2]:
+                region = data[0]
+                if (distance <= self._wake_radius
+                    or region is not None
+                    and region[0] <= pos[0] <= region[0] + region[2]
+                    and region[1] <= pos[1] <= region[1] + region[3]):
+                    data[2] = 1
+                else:
+                    continue
+            elif (self._sleep_radius is not None
+                  and distance > self._sleep_radius
+                  and data[3] <= 0):
+                data[2] = 0
+                data[4] = 0
+                continue
+            data[4] += rel_game_speed
+            if (self._tick + data[1]) % self.interval(distance) == 0:
+                thinking[entity] = data[4]
+                data[4] = 0
+        return thinking
@@ -0,0 +1,328 @@
+import math
+import time
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+import pygame as pg
+from pygame.typing import Point
+
+from systems.tiles import TileGrid
+from systems.raycast import cast_rays
+
+# elevations are rounded to this in the occlusion cache
+_ELEVATION_STEP = 0.25
+
+
+# Positional voices on a fixed number of reserved mixer channels
+# Every voice is tracked in arrays whether it has a channel or not, each
+# update() computes every voice's gain and pan at once, voices past
+# max_distance or too quiet are culled and the loudest (by priority first)
+# get the real channels while the rest play virtually (time still passes
+# so a one shot that would come back too late stays virtual, a loop that
+# gets a channel back starts over since pygame can't play a Sound from the
+# middle)
+# With a grid, voices behind walls are muffled, the wall test is cached per
+# (listener tile and elevation, voice tile and elevation) until the grid
+# changes
+class AudioEngine(object):
+    def __init__(self: Self,
+                 channels: int=16,
+                 capacity: int=128,
+                 max_distance: Real=16,
+                 rolloff: Real=2,
+                 threshold: Real=0.01,
+                 grid: Optional[TileGrid]=None,
+                 occlusion: Real=0.35,
+                 restart_window: Real=0.1) -> None:
+
+        self._max_distance = max_distance
+        self._rolloff = rolloff
+        self._threshold = threshold # gain under which a voice is culled
+        self._grid = grid
+        self._occlusion = occlusion # gain multiplier behind walls
+        self._occluded = {} # ((x, y, elevation) of listener, voice): bool
+        self._grid_version = None
+        # a one shot that gets a channel later than this (s) stays virtual
+        self._restart_window = restart_window
+
+        self._capacity = capacity
+        self._pos = np.zeros((capacity, 2))
+        self._elevation = np.zeros(capacity)
+        self._volume = np.zeros(capacity)
+        self._priority = np.zeros(capacity)
+        self._positional = np.zeros(capacity, dtype=np.bool_)
+        self._start = np.zeros(capacity)
+        self._length = np.zeros(capacity)
+        self._loop = np.zeros(capacity, dtype=np.bool_)
+        self._active = np.zeros(capacity, dtype=np.bool_)
+        self._channel = np.full(capacity, -1, dtype=np.intp)
+        self._gain = np.zeros(capacity)
+        self._sounds = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+
+        self._channels = []
+        self._owners = [] # voice playing on every channel (-1 if none)
+        if pg.mixer.get_init() is not None:
+            pg.mixer.set_num_channels(
+                max(pg.mixer.get_num_channels(), channels + 8),
+            )
+            # reserved channels aren't handed out to Sound.play()
+            pg.mixer.set_reserved(channels)
+            self._channels = [pg.mixer.Channel(dex) for dex in range(channels)]
+            self._owners = [-1] * channels
+
+    @property
+    def channels(self: Self) -> int:
+        return len(self._channels)
+
+    @property
+    def voices(self: Self) -> int:
+        return int(np.count_nonzero(self._active))
+
+    @property
+    def real(self: Self) -> int:
+        return int(np.count_nonzero(self._channel >= 0))
+
+    # pos None plays without position (ui, music), elevation is the height
+    # of the source, returns the voice (-1 if every voice is taken by
+    # something with a higher priority)
+    def play(self: Self,
+             sound: pg.mixer.Sound,
+             pos: Optional[Point]=None,
+             elevation: Real=0.5,
+             volume: Real=1,
+             priority: Real=0,
+             loop: bool=0,
+             now: Optional[float]=None) -> int:
+
+        now = time.perf_counter() if now is None else now
+        if not self._free:
+            # steal the quietest voice below this priority
+            candidates = np.flatnonzero(
+                self._active & (self._priority <= priority),
+            )
+            if not candidates.size:
+                return -1
+            self.stop(int(candidates[np.argmin(self._gain[candidates])]))
+        voice = self._free.pop()
+        self._positional[voice] = pos is not None
+        if pos is not None:
+            self._pos[voice] = pos[0], pos[1]
+        self._elevation[voice] = elevation
+        self._volume[voice] = volume
+        self._priority[voice] = priority
+        self._start[voice] = now
+        self._length[voice] = sound.get_length()
+        self._loop[voice] = loop
+        self._active[voice] = 1
+        self._channel[voice] = -1
+        self._gain[voice] = volume
+        self._sounds[voice] = sound
+        return voice
+
+    def move(self: Self,
+             voice: int,
+             pos: Point,
+             elevation: Optional[Real]=None) -> None:
+        self._pos[voice] = pos[0], pos[1]
+        if elevation is not None:
+            self._elevation[voice] = elevation
+
+    def stop(self: Self, voice: int) -> None:
+        if not self._active[voice]:
+            return
+        channel = self._channel[voice]
+        if channel >= 0:
+            self._channels[channel].stop()
+            self._owners[channel] = -1
+        self._active[voice] = 0
+        self._channel[voice] = -1
+        self._sounds[voice] = None
+        self._free.append(voice)
+
+    def stop_all(self: Self) -> None:
+        for voice in np.flatnonzero(self._active):
+            self.stop(int(voice))
+
+    def _occlusion_of(self: Self,
+                      listener: Point,
+                      elevation: Real,
+                      voices: np.ndarray) -> np.ndarray:
+
+        if self._grid.version != self._grid_version:
+            self._occluded = {}
+            self._grid_version = self._grid.version
+        listener_tile = (math.floor(listener[0]), math.floor(listener[1]))
+        level = round(elevation / _ELEVATION_STEP)
+        tiles = np.floor(self._pos[voices]).astype(np.intp)
+        levels = np.round(
+            self._elevation[voices] / _ELEVATION_STEP,
+        ).astype(np.intp)
+        keys = [
+            ((*listener_tile, level), (int(x), int(y), int(z)))
+            for (x, y), z in zip(tiles, levels)
+        ]
+        missing = [
+            dex for dex, key in enumerate(keys) if key not in self._occluded
+        ]
+        if missing:
+            # tile center to tile center at the rounded elevations so the
+            # cache holds for the key
+            centers = tiles[missing] + 0.5
+            origin = np.add(listener_tile, 0.5)
+            dirs = centers - origin
+            z = level * _ELEVATION_STEP
+            dz = levels[missing] * _ELEVATION_STEP - z
+            hit = cast_rays(self._grid, origin, dirs, 1, z=z, dz=dz)[0]
+            for dex, blocked in zip(missing, hit):
+                self._occluded[keys[dex]] = bool(blocked)
+        return np.array([self._occluded[key] for key in keys])
+
+    # listener_yaw in degrees like entities
+    def update(self: Self,
+               listener: Point,
+               listener_yaw: Real,
+               listener_elevation: Real=0.5,
+               now: Optional[float]=None) -> None:
+
+        now = time.perf_counter() if now is None else now
+        active = np.flatnonzero(self._active)
+        if not active.size:
+            return
+
+        # finished one shots
+        elapsed = now - self._start[active]
+        done = ~self._loop[active] & (elapsed >= self._length[active])
+        for voice in active[done]:
+            self.stop(int(voice))
+        active = active[~done]
+        if not active.size:
+            return
+
+        # gain and pan
+        rel = self._pos[active] - listener
+        dz = self._elevation[active] - listener_elevation
+        distances = np.sqrt(rel[:, 0] ** 2 + rel[:, 1] ** 2 + dz ** 2)
+        positional = self._positional[active]
+        falloff = np.clip(1 - distances / self._max_distance, 0, 1)
+        gains = self._volume[active] * np.where(
+            positional, falloff ** self._rolloff, 1,
+        )
+        if self._grid is not None and positional.any():
+            voices = active[positional]
+            occluded = self._occlusion_of(listener, listener_elevation, voices)
+            gains[positional] *= np.where(occluded, self._occlusion, 1)
+        radians = math.radians(listener_yaw)
+        right = (-math.sin(radians), math.cos(radians))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pans = (rel[:, 0] * right[0] + rel[:, 1] * right[1]) / np.hypot(
+                rel[:, 0], rel[:, 1],
+            )
+        pans = np.where(positional & np.isfinite(pans), pans, 0)
+        angles = (pans + 1) * math.pi / 4
+        lefts = gains * np.cos(angles) * math.sqrt(2)
+        rights = gains * np.sin(angles) * math.sqrt(2)
+        self._gain[active] = gains
+
+        # who gets a channel: audible, then by priority, then by gain
+        audible = gains >= self._threshold
+        order = np.lexsort((-gains, -self._priority[active]))
+        order = order[audible[order]]
+        one_shot = ~self._loop[active]
+        late = one_shot & (elapsed[~done] > self._restart_window)
+        real = set()
+        for dex in order:
+            if len(real) >= len(self._channels):
+                break
+            voice = active[dex]
+            # a one shot that is already playing virtually can't be joined
+            # midway, so it keeps going without a channel
+            if self._channel[voice] < 0 and late[dex]:
+                continue
+            real.add(int(voice))
+
+        # give up channels first so they can be reused this tick
+        for dex, voice in enumerate(active):
+            channel = self._channel[voice]
+            if channel >= 0 and int(voice) not in real:
+                self._channels[channel].stop()
+                self._owners[channel] = -1
+                self._channel[voice] = -1
+        free = [
+            channel for channel, owner in enumerate(self._owners) if owner < 0
+        ]
+        for dex, voice in enumerate(active):
+            voice = int(voice)
+            if voice not in real:
+                continue
+            channel = self._channel[voice]
+            if channel < 0:
+                channel = free.pop()
+                self._channels[channel].play(
+                    self._sounds[voice], loops=-1 if self._loop[voice] else 0,
+                )
+                self._owners[channel] = voice
+                self._channel[voice] = channel
+            self._channels[channel].set_volume(
+                float(min(lefts[dex], 1)), float(min(rights[dex], 1)),
+            )
+
+
+# the pg.mixer.Sound behind one of the engine's sounds (kept in its _sound)
+def _mixer_sound(sound: object) -> pg.mixer.Sound:
+    if isinstance(sound, pg.mixer.Sound):
+        return sound
+    return sound._sound
+
+
+# One of the engine's sounds whose positional play() goes through audio
+# pos is (x, elevation, y) like the engine's, anything else is passed on
+class RoutedSound(object):
+    def __init__(self: Self, sound: object, audio: AudioEngine) -> None:
+        self._sound = sound
+        self._mixer_sound = _mixer_sound(sound)
+        self._audio = audio
+
+    def play(self: Self, *args: object, **kwargs: object) -> object:
+        pos = kwargs.get('pos')
+        if pos is None:
+            return self._sound.play(*args, **kwargs)
+        return self._audio.play(
+            self._mixer_sound,
+            (pos[0], pos[-1]),
+            elevation=pos[1] if len(pos) > 2 else 0.5,
+            volume=kwargs.get('volume', 1),
+            loop=kwargs.get('loops', 0) == -1,
+        )
+
+    def __getattr__(self: Self, name: str) -> object:
+        return getattr(self._sound, name)
+
+
+# Stands in for the engine's sound dict (level.sounds) so positional sounds
+# the level plays get mixed by the AudioEngine, attributes are read from
+# and written to the wrapped sounds
+class RoutedSounds(object):
+    def __init__(self: Self, sounds: object, audio: AudioEngine) -> None:
+        object.__setattr__(self, '_sounds', sounds)
+        object.__setattr__(self, '_audio', audio)
+        object.__setattr__(self, '_routed', {}) # name: RoutedSound
+
+    def __getitem__(self: Self, name: str) -> RoutedSound:
+        routed = self._routed.get(name)
+        if routed is None:
+            routed = self._routed[name] = RoutedSound(
+                self._sounds[name], self._audio,
+            )
+        return routed
+
+    def __contains__(self: Self, name: str) -> bool:
+        return name in self._sounds
+
+    def __getattr__(self: Self, name: str) -> object:
+        return getattr(self._sounds, name)
+
+    def __setattr__(self: Self, name: str, value: object) -> None:
+        setattr(self._sounds, name, value)
@@ -0,0 +1,74 @@
+from typing import Self
+from typing import Hashable
+from typing import Optional
+from collections import OrderedDict
+
+import pygame as pg
+
+
+# LRU cache of surfaces capped by the bytes of pixel data it holds
+class SurfaceCache(object):
+    def __init__(self: Self, max_bytes: int) -> None:
+        self._max_bytes = max_bytes
+        self._surfs = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def max_bytes(self: Self) -> int:
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self: Self, value: int) -> None:
+        self._max_bytes = value
+        self._evict()
+
+    @property
+    def bytes(self: Self) -> int:
+        return self._bytes
+
+    @property
+    def hits(self: Self) -> int:
+        return self._hits
+
+    @property
+    def misses(self: Self) -> int:
+        return self._misses
+
+    def __len__(self: Self) -> int:
+        return len(self._surfs)
+
+    def __contains__(self: Self, key: Hashable) -> bool:
+        return key in self._surfs
+
+    @staticmethod
+    def surf_bytes(surf: pg.Surface) -> int:
+        return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+    def get(self: Self, key: Hashable) -> Optional[pg.Surface]:
+        surf = self._surfs.get(key)
+        if surf is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._surfs.move_to_end(key)
+        return surf
+
+    def set(self: Self, key: Hashable, surf: pg.Surface) -> None:
+        old = self._surfs.pop(key, None)
+        if old is not None:
+            self._bytes -= self.surf_bytes(old)
+        self._surfs[key] = surf
+        self._bytes += self.surf_bytes(surf)
+        self._evict()
+
+    def clear(self: Self) -> None:
+        self._surfs = OrderedDict()
+        self._bytes = 0
+
+    def _evict(self: Self) -> None:
+        # never evicts the newest surf so a set is always usable
+        while self._bytes > self._max_bytes and len(self._surfs) > 1:
+            _, surf = self._surfs.popitem(last=False)
+            self._bytes -= self.surf_bytes(surf)
@@ -0,0 +1,212 @@
+import math
+from numbers import Real
+from typing import Self
+
+import numpy as np
+
+from systems.tiles import TileGrid
+from systems.raycast import cast_rays
+
+# neighborhood offsets around every entity's cell
+_OFFSETS = np.array(
+    [(x, y) for x in (-1, 0, 1) for y in (-1, 0, 1)], dtype=np.intp,
+)
+_SKIN = 1e-6
+_THICKNESS = 4 * _SKIN
+
+
+# (bodies, 9, 4) boxes and (bodies, 9) spans of the tiles around every body
+# rect / semitile tiles use the bounds of their segments, a semitile line
+# has no width so it is padded to _THICKNESS on either side (any body
+# straddling it overlaps it by more than _SKIN)
+def gather_tiles(grid: TileGrid, pos: np.ndarray) -> tuple:
+    cells = np.floor(pos).astype(np.intp)[:, None, :] + _OFFSETS[None]
+    gx, gy = grid.indices(cells[..., 0], cells[..., 1])
+    solid = grid.solid[gx, gy]
+    rows = grid.rows[gx, gy]
+    boxes = np.concatenate((cells, cells + 1), axis=2).astype(np.float64)
+    thin = rows >= 0
+    bounds = grid.geometry.bounds[rows[thin]]
+    for axis in (0, 1):
+        # empty rows are inverted (negative width) and stay that way
+        widths = bounds[:, axis + 2] - bounds[:, axis]
+        flat = (widths >= 0) & (widths < 2 * _THICKNESS)
+        bounds[flat, axis] -= _THICKNESS
+        bounds[flat, axis + 2] += _THICKNESS
+    boxes[thin] = bounds
+    bottoms = grid.elevation[gx, gy]
+    tops = bottoms + grid.height[gx, gy]
+    return (solid, boxes, bottoms, tops)
+
+
+def _overlaps(pos: np.ndarray,
+              radius: np.ndarray,
+              boxes: np.ndarray) -> tuple:
+    x = (
+        np.minimum(pos[:, 0, None] + radius[:, None], boxes[..., 2])
+        - np.maximum(pos[:, 0, None] - radius[:, None], boxes[..., 0])
+    )
+    y = (
+        np.minimum(pos[:, 1, None] + radius[:, None], boxes[..., 3])
+        - np.maximum(pos[:, 1, None] - radius[:, None], boxes[..., 1])
+    )
+    return (x > _SKIN, y > _SKIN)
+
+
+# Wall and floor / ceiling contacts for every body at once
+# Bodies are squares of half size radius, a tile is a wall for a body when
+# its span overlapped the body before this tick's vertical move and its top
+# is higher than elevation + climb (so jumping into a tile is a ceiling)
+# Positions are resolved one axis at a time (x, then y) from old_pos, a
+# body is pushed back out of the side it came from or, if it didn't move on
+# that axis (a door closed on it), out of the nearest side
+# pos, elevation and elevation_velocity are written back in place
+# returns {'x': (bodies, ), 'y': (bodies, ), 'e': (floor, ceiling)}
+def resolve_tiles(grid: TileGrid,
+                  old_pos: np.ndarray,
+                  pos: np.ndarray,
+                  old_elevation: np.ndarray,
+                  elevation: np.ndarray,
+                  elevation_velocity: np.ndarray,
+                  height: np.ndarray,
+                  radius: np.ndarray,
+                  climb: np.ndarray) -> dict:
+
+    solid, boxes, bottoms, tops = gather_tiles(grid, pos)
+    walls = (
+        solid
+        & (bottoms < (old_elevation + height)[:, None])
+        & (tops > (old_elevation + climb)[:, None])
+    )
+
+    flags = {}
+    for axis in (0, 1):
+        # only this axis has moved so far
+        moved = old_pos.copy()
+        moved[:, :axis + 1] = pos[:, :axis + 1]
+        over_x, over_y = _overlaps(moved, radius, boxes)
+        hits = walls & over_x & over_y
+        hit = hits.any(axis=1)
+        lower = np.where(
+            hits, boxes[..., axis] - radius[:, None] - _SKIN, np.inf,
+        ).min(axis=1)
+        upper = np.where(
+            hits, boxes[..., axis + 2] + radius[:, None] + _SKIN, -np.inf,
+        ).max(axis=1)
+        forward = np.where(
+            pos[:, axis] == old_pos[:, axis],
+            pos[:, axis] - lower <= upper - pos[:, axis],
+            pos[:, axis] > old_pos[:, axis],
+        )
+        limit = np.where(forward, lower, upper)
+        pos[hit, axis] = limit[hit]
+        flags['xy'[axis]] = hit
+
+    # floor and ceiling under / over the footprint
+    over_x, over_y = _overlaps(pos, radius, boxes)
+    footprint = solid & over_x & over_y
+    standing = footprint & (tops <= (old_elevation + climb)[:, None])
+    floors = np.where(standing, tops, 0).max(axis=1)
+    above = footprint & ~standing & (bottoms >= old_elevation[:, None])
+    ceilings = np.where(above, bottoms, np.inf).min(axis=1)
+
+    floor = elevation <= floors
+    elevation[floor] = floors[floor]
+    elevation_velocity[floor] = np.maximum(elevation_velocity[floor], 0)
+    ceiling = elevation + height > ceilings
+    elevation[ceiling] = ceilings[ceiling] - height[ceiling]
+    elevation_velocity[ceiling] = np.minimum(
+        elevation_velocity[ceiling], 0,
+    )
+    flags['e'] = (floor, ceiling)
+    return flags
+
+
+# Continuous collision for bodies that move far enough in one step to skip
+# over a wall (more than their radius, thin walls are thinner than a body)
+# A ray at the feet (elevation + climb) and one at the head is cast along
+# every fast body's move and the body is stopped radius short of the
+# nearest hit; resolve_tiles then handles the contact itself
+# pos is written back in place
+# returns the axis of the wall every body was stopped by (-1 if none)
+def sweep_tiles(grid: TileGrid,
+                old_pos: np.ndarray,
+                pos: np.ndarray,
+                elevation: np.ndarray,
+                height: np.ndarray,
+                radius: np.ndarray,
+                climb: np.ndarray) -> np.ndarray:
+
+    axes = np.full(len(pos), -1, dtype=np.int8)
+    deltas = pos - old_pos
+    lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+    fast = np.flatnonzero(lengths > radius)
+    if not fast.size:
+        return axes
+    count = fast.size
+    feet = elevation[fast] + climb[fast] + _SKIN
+    heads = elevation[fast] + height[fast] - _SKIN
+    hit, distances, cells, sides = cast_rays(
+        grid,
+        np.concatenate((old_pos[fast], old_pos[fast])),
+        np.concatenate((deltas[fast], deltas[fast])),
+        1,
+        z=np.concatenate((feet, heads)),
+    )
+    feet_first = distances[:count] <= distances[count:]
+    sides = np.where(feet_first, sides[:count], sides[count:])
+    hit = hit[:count] | hit[count:]
+    distances = np.minimum(distances[:count], distances[count:])
+    fractions = np.maximum(
+        distances - radius[fast] / lengths[fast], 0,
+    )
+    bodies = fast[hit]
+    pos[bodies] = (
+        old_pos[bodies] + deltas[bodies] * fractions[hit, None]
+    )
+    axes[bodies] = sides[hit]
+    return axes
+
+
+# Splits a frame into sub steps so no body moves more than max_distance per
+# step, with at most max_steps per frame (sweep_tiles covers the rest)
+class SubStepper(object):
+    def __init__(self: Self,
+                 max_distance: Real=0.2,
+                 max_steps: int=8) -> None:
+        self._max_distance = max_distance
+        self._max_steps = max_steps
+        self._steps = 1
+
+    @property
+    def max_distance(self: Self) -> Real:
+        return self._max_distance
+
+    @max_distance.setter
+    def max_distance(self: Self, value: Real) -> None:
+        self._max_distance = value
+
+    @property
+    def max_steps(self: Self) -> int:
+        return self._max_steps
+
+    @max_steps.setter
+    def max_steps(self: Self, value: int) -> None:
+        self._max_steps = value
+
+    # steps used by the last split (for profiling)
+    @property
+    def steps(self: Self) -> int:
+        return self._steps
+
+    # speed is the fastest body's speed per tick
+    # returns (steps, rel_game_speed of each step)
+    def split(self: Self,
+              rel_game_speed: Real,
+              speed: Real) -> tuple[int, Real]:
+        distance = speed * rel_game_speed
+        self._steps = min(
+            max(math.ceil(distance / self._max_distance), 1),
+            self._max_steps,
+        )
+        return (self._steps, rel_game_speed / self._steps)
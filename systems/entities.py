@@ -0,0 +1,381 @@
+import math
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+import pygame as pg
+from pygame.typing import Point
+
+from systems.tiles import TileGrid
+from systems.collision import sweep_tiles
+from systems.collision import resolve_tiles
+
+
+# Struct of arrays for entity physics so a tick is one vectorized pass
+# Entities are handed out as EntityProxy objects with the usual attributes
+# Velocities are per tick (like the rest of the game) and scaled by
+# rel_game_speed
+class EntityStore(object):
+
+    _GRAVITY = 0.004
+
+    def __init__(self: Self, capacity: int=64) -> None:
+        self._capacity = 0
+        self._pos = np.zeros((0, 2))
+        self._velocity = np.zeros((0, 2))
+        self._elevation = np.zeros(0)
+        self._elevation_velocity = np.zeros(0)
+        self._height = np.zeros(0)
+        self._yaw = np.zeros(0)
+        self._friction = np.zeros(0)
+        self._gravity = np.zeros(0)
+        self._radius = np.zeros(0)
+        self._climb = np.zeros(0)
+        self._collisions = {
+            'x': np.zeros(0, dtype=np.bool_),
+            'y': np.zeros(0, dtype=np.bool_),
+            'e': (np.zeros(0, dtype=np.bool_), np.zeros(0, dtype=np.bool_)),
+        }
+        self._alive = np.zeros(0, dtype=np.bool_)
+        self._proxies = []
+        self._free = []
+        self._grow(capacity)
+
+    @property
+    def capacity(self: Self) -> int:
+        return self._capacity
+
+    @property
+    def pos(self: Self) -> np.ndarray:
+        return self._pos
+
+    @property
+    def velocity(self: Self) -> np.ndarray:
+        return self._velocity
+
+    @property
+    def elevation(self: Self) -> np.ndarray:
+        return self._elevation
+
+    @property
+    def elevation_velocity(self: Self) -> np.ndarray:
+        return self._elevation_velocity
+
+    @property
+    def height(self: Self) -> np.ndarray:
+        return self._height
+
+    @property
+    def yaw(self: Self) -> np.ndarray:
+        return self._yaw
+
+    @property
+    def friction(self: Self) -> np.ndarray:
+        return self._friction
+
+    @property
+    def gravity(self: Self) -> np.ndarray:
+        return self._gravity
+
+    @property
+    def radius(self: Self) -> np.ndarray:
+        return self._radius
+
+    @property
+    def climb(self: Self) -> np.ndarray:
+        return self._climb
+
+    # same layout as an entity's collisions but with arrays
+    @property
+    def collisions(self: Self) -> dict:
+        return self._collisions
+
+    @property
+    def alive(self: Self) -> np.ndarray:
+        return self._alive
+
+    @property
+    def entities(self: Self) -> list:
+        return [proxy for proxy in self._proxies if proxy is not None]
+
+    def __len__(self: Self) -> int:
+        return int(self._alive.sum())
+
+    def _grow(self: Self, capacity: int) -> None:
+        extra = capacity - self._capacity
+        if extra <= 0:
+            return
+        self._pos = np.concatenate((self._pos, np.zeros((extra, 2))))
+        self._velocity = np.concatenate(
+            (self._velocity, np.zeros((extra, 2))),
+        )
+        for name in ('_elevation',
+                     '_elevation_velocity',
+                     '_height',
+                     '_yaw',
+                     '_friction',
+                     '_gravity',
+                     '_radius',
+                     '_climb'):
+            setattr(
+                self,
+                name,
+                np.concatenate((getattr(self, name), np.zeros(extra))),
+            )
+        self._alive = np.concatenate(
+            (self._alive, np.zeros(extra, dtype=np.bool_)),
+        )
+        # the flags of existing rows are kept
+        flags = np.zeros(extra, dtype=np.bool_)
+        collisions = self._collisions
+        self._collisions = {
+            'x': np.concatenate((collisions['x'], flags)),
+            'y': np.concatenate((collisions['y'], flags)),
+            'e': (
+                np.concatenate((collisions['e'][0], flags)),
+                np.concatenate((collisions['e'][1], flags)),
+            ),
+        }
+        self._proxies.extend([None] * extra)
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    def spawn(self: Self,
+              pos: Point,
+              elevation: Real=0,
+              height: Real=0.6,
+              yaw: Real=0,
+              friction: Real=0.90625,
+              gravity: Optional[Real]=None,
+              radius: Real=0.2,
+              climb: Real=0.25) -> 'EntityProxy':
+
+        if not self._free:
+            self._grow(self._capacity * 2)
+        index = self._free.pop()
+        self._pos[index] = pos
+        self._velocity[index] = 0
+        self._elevation[index] = elevation
+        self._elevation_velocity[index] = 0
+        self._height[index] = height
+        self._yaw[index] = yaw
+        self._friction[index] = friction
+        self._gravity[index] = self._GRAVITY if gravity is None else gravity
+        self._radius[index] = radius
+        self._climb[index] = climb
+        self._alive[index] = 1
+        proxy = EntityProxy(self, index)
+        self._proxies[index] = proxy
+        return proxy
+
+    def kill(self: Self, entity: 'EntityProxy') -> None:
+        index = entity.index
+        if self._proxies[index] is entity:
+            self._alive[index] = 0
+            self._proxies[index] = None
+            self._free.append(index)
+
+    # integration, friction and gravity for every entity at once, then
+    # tile collisions if a grid is given
+    # dead rows are integrated too since masking costs more than it saves;
+    # spawn resets them anyway
+    def step(self: Self,
+             rel_game_speed: Real,
+             grid: Optional[TileGrid]=None) -> None:
+        if grid is not None:
+            old_pos = self._pos.copy()
+            old_elevation = self._elevation.copy()
+        self._velocity *= (self._friction ** rel_game_speed)[:, None]
+        self._pos += self._velocity * rel_game_speed
+        self._elevation_velocity -= self._gravity * rel_game_speed
+        self._elevation += self._elevation_velocity * rel_game_speed
+        if grid is not None:
+            self.collide(grid, old_pos, old_elevation)
+
+    def collide(self: Self,
+                grid: TileGrid,
+                old_pos: np.ndarray,
+                old_elevation: np.ndarray) -> None:
+        axes = sweep_tiles(
+            grid,
+            old_pos,
+            self._pos,
+            old_elevation,
+            self._height,
+            self._radius,
+            self._climb,
+        )
+        self._collisions = resolve_tiles(
+            grid,
+            old_pos,
+            self._pos,
+            old_elevation,
+            self._elevation,
+            self._elevation_velocity,
+            self._height,
+            self._radius,
+            self._climb,
+        )
+        self._collisions['x'] |= axes == 0
+        self._collisions['y'] |= axes == 1
+
+    # Rows can stand in for outside bodies (the engine's player and
+    # enemies, anything with pos, elevation and height) so their moves get
+    # the batched swept collision, bodies is {body: proxy}
+    def pull(self: Self, bodies: dict) -> None:
+        for body, proxy in bodies.items():
+            index = proxy.index
+            self._pos[index] = body.pos
+            self._elevation[index] = body.elevation
+            self._height[index] = body.height
+
+    # sweeps the move of every row since old_pos and moves the bodies
+    # whose rows were stopped short of a wall
+    # returns the axes like sweep_tiles
+    def sweep(self: Self,
+              grid: TileGrid,
+              bodies: dict,
+              old_pos: np.ndarray,
+              old_elevation: np.ndarray) -> np.ndarray:
+        axes = sweep_tiles(
+            grid,
+            old_pos,
+            self._pos,
+            old_elevation,
+            self._height,
+            self._radius,
+            self._climb,
+        )
+        for body, proxy in bodies.items():
+            index = proxy.index
+            if axes[index] >= 0:
+                body.pos = (
+                    float(self._pos[index, 0]), float(self._pos[index, 1]),
+                )
+        return axes
+
+
+# Attribute view of one row of an EntityStore
+class EntityProxy(object):
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self: Self, store: EntityStore, index: int) -> None:
+        self._store = store
+        self._index = index
+
+    @property
+    def store(self: Self) -> EntityStore:
+        return self._store
+
+    @property
+    def index(self: Self) -> int:
+        return self._index
+
+    @property
+    def alive(self: Self) -> bool:
+        return bool(self._store.alive[self._index])
+
+    @property
+    def pos(self: Self) -> pg.Vector2:
+        return pg.Vector2(self._store.pos[self._index])
+
+    @pos.setter
+    def pos(self: Self, value: Point) -> None:
+        self._store.pos[self._index] = value
+
+    @property
+    def tile(self: Self) -> tuple[int, int]:
+        pos = self._store.pos[self._index]
+        return (math.floor(pos[0]), math.floor(pos[1]))
+
+    @property
+    def velocity2(self: Self) -> pg.Vector2:
+        return pg.Vector2(self._store.velocity[self._index])
+
+    @velocity2.setter
+    def velocity2(self: Self, value: Point) -> None:
+        self._store.velocity[self._index] = value
+
+    @property
+    def elevation(self: Self) -> float:
+        return float(self._store.elevation[self._index])
+
+    @elevation.setter
+    def elevation(self: Self, value: Real) -> None:
+        self._store.elevation[self._index] = value
+
+    @property
+    def elevation_velocity(self: Self) -> float:
+        return float(self._store.elevation_velocity[self._index])
+
+    @elevation_velocity.setter
+    def elevation_velocity(self: Self, value: Real) -> None:
+        self._store.elevation_velocity[self._index] = value
+
+    @property
+    def height(self: Self) -> float:
+        return float(self._store.height[self._index])
+
+    @height.setter
+    def height(self: Self, value: Real) -> None:
+        self._store.height[self._index] = value
+
+    @property
+    def yaw(self: Self) -> float:
+        return float(self._store.yaw[self._index])
+
+    @yaw.setter
+    def yaw(self: Self, value: Real) -> None:
+        self._store.yaw[self._index] = value
+
+    @property
+    def forward(self: Self) -> pg.Vector2:
+        yaw = math.radians(self._store.yaw[self._index])
+        return pg.Vector2(math.cos(yaw), math.sin(yaw))
+
+    @property
+    def friction(self: Self) -> float:
+        return float(self._store.friction[self._index])
+
+    @friction.setter
+    def friction(self: Self, value: Real) -> None:
+        self._store.friction[self._index] = value
+
+    @property
+    def gravity(self: Self) -> float:
+        return float(self._store.gravity[self._index])
+
+    @gravity.setter
+    def gravity(self: Self, value: Real) -> None:
+        self._store.gravity[self._index] = value
+
+    @property
+    def radius(self: Self) -> float:
+        return float(self._store.radius[self._index])
+
+    @radius.setter
+    def radius(self: Self, value: Real) -> None:
+        self._store.radius[self._index] = value
+
+    @property
+    def climb(self: Self) -> float:
+        return float(self._store.climb[self._index])
+
+    @climb.setter
+    def climb(self: Self, value: Real) -> None:
+        self._store.climb[self._index] = value
+
+    @property
+    def collisions(self: Self) -> dict:
+        collisions = self._store.collisions
+        index = self._index
+        return {
+            'x': bool(collisions['x'][index]),
+            'y': bool(collisions['y'][index]),
+            'e': (
+                bool(collisions['e'][0][index]),
+                bool(collisions['e'][1][index]),
+            ),
+        }
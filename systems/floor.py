@@ -0,0 +1,190 @@
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+import pygame as pg
+from pygame.typing import Point
+from pygame.typing import ColorLike
+
+from systems.tiles import TileGrid
+from systems.shading import ShadeTable
+from systems.lighting import LightGrid
+from systems.raycast import gen_plane
+from systems.raycast import gen_column_dirs
+
+
+# Casts the floor (tile top colors) and ceiling (tile bottom colors) planes
+# in one vectorized pass straight into the surface's pixels
+# Cells are shaded by their tile's darkness like walls are (darkness for
+# cells without one)
+# Everything is (x, y) indexed like pg.surfarray
+class FloorCaster(object):
+    def __init__(self: Self,
+                 size: Point,
+                 fov: Real,
+                 tile_size: Real,
+                 grid: TileGrid,
+                 shades: Optional[ShadeTable]=None,
+                 ceiling: Real=1,
+                 floor_color: ColorLike=(0, 0, 0),
+                 ceiling_color: ColorLike=(0, 0, 0)) -> None:
+
+        self._size = (int(size[0]), int(size[1]))
+        self._tile_size = tile_size
+        self._grid = grid
+        self._shades = shades
+        self._ceiling = ceiling
+        self._floor_color = pg.Color(floor_color)
+        self._ceiling_color = pg.Color(ceiling_color)
+        self._rows = np.arange(self._size[1], dtype=np.float32) + 0.5
+        self.fov = fov
+
+        # (bands, 2, cells) of mapped colors; 0 is ceiling, 1 is floor
+        self._table = None
+        self._table_key = None
+        self._colors = None # (2, cells, 3) unshaded colors of the table
+        self._darkness = None # (cells, ) darkness of the table
+        self._lights = None # light grid baked into the table
+        self._light_version = None
+
+    @property
+    def fov(self: Self) -> Real:
+        return self._fov
+
+    @fov.setter
+    def fov(self: Self, value: Real) -> None:
+        self._fov = value
+        self._plane = gen_plane(self._size[0], value)
+
+    @property
+    def ceiling(self: Self) -> Real:
+        return self._ceiling
+
+    @ceiling.setter
+    def ceiling(self: Self, value: Real) -> None:
+        self._ceiling = value
+
+    @property
+    def grid(self: Self) -> TileGrid:
+        return self._grid
+
+    @grid.setter
+    def grid(self: Self, value: TileGrid) -> None:
+        self._grid = value
+        self._table_key = None
+
+    @staticmethod
+    def _pack(surf: pg.Surface, colors: np.ndarray) -> np.ndarray:
+        shifts = surf.get_shifts()
+        colors = colors.astype(np.uint32)
+        return (
+            (colors[..., 0] << shifts[0])
+            | (colors[..., 1] << shifts[1])
+            | (colors[..., 2] << shifts[2])
+            | np.uint32(surf.get_masks()[3])
+        )
+
+    # (bands, 2, len(cells)) colors of cells at their own darkness and lit
+    # by the light grid
+    def _lit(self: Self,
+             lights: Optional[LightGrid],
+             cells: slice | np.ndarray) -> np.ndarray:
+        darkness = self._darkness[cells]
+        if lights is not None:
+            darkness = darkness * lights.multiplier.ravel()[cells]
+        factors = self._shades.factors_at(
+            darkness[None, :], np.arange(self._shades.bands)[:, None],
+        ).astype(np.float32)
+        return (
+            self._colors[None, :, cells] * factors[:, None, :, None]
+        ).astype(np.uint8)
+
+    def _update_table(self: Self,
+                      surf: pg.Surface,
+                      darkness: Real,
+                      lights: Optional[LightGrid]) -> None:
+        grid = self._grid
+        if self._shades is None:
+            lights = None
+        key = (
+            grid.color_version, grid.shape, darkness, surf.get_masks(), lights,
+        )
+        if key == self._table_key:
+            if lights is None:
+                return
+            # only the windows lights changed since the table was built
+            changes = lights.changes(self._light_version)
+            if changes is not None:
+                self._light_version = lights.version
+                if not changes:
+                    return
+                flat = np.zeros(grid.shape, dtype=np.bool_)
+                for slices in changes:
+                    flat[slices] = 1
+                cells = np.flatnonzero(flat)
+                table = self._table.reshape(self._shades.bands, 2, -1)
+                table[:, :, cells] = self._pack(
+                    surf, self._lit(lights, cells),
+                )
+                return
+        solid = grid.solid[..., None]
+        self._colors = np.stack((
+            np.where(solid, grid.bottom, self._ceiling_color[:3]),
+            np.where(solid, grid.top, self._floor_color[:3]),
+        )).astype(np.uint8).reshape(2, -1, 3)
+        static = grid.darkness.ravel()
+        uniform = np.isnan(static).all()
+        self._darkness = np.where(np.isnan(static), darkness, static)
+        if self._shades is None:
+            colors = self._colors[None]
+        elif lights is None and uniform:
+            # shading is baked into the table so the pass is a single gather
+            colors = self._shades.lut(darkness)[:, self._colors]
+        else:
+            # so is the darkness and light of every cell, lights only move
+            # the cells they touch
+            colors = self._lit(lights, slice(None))
+            if lights is not None:
+                self._light_version = lights.version
+        self._table = self._pack(surf, colors).ravel()
+        self._table_key = key
+
+    def render(self: Self,
+               surf: pg.Surface,
+               pos: Point,
+               forward: Point,
+               eye: Real,
+               horizon: Real,
+               darkness: Real=1,
+               lights: Optional[LightGrid]=None) -> None:
+
+        self._update_table(surf, darkness, lights)
+
+        # per row perpendicular distance to the floor / ceiling plane
+        rows = self._rows - horizon * self._size[1]
+        floor = rows > 0
+        with np.errstate(divide='ignore'):
+            distances = np.where(
+                floor,
+                max(eye, 0) / rows,
+                max(self._ceiling - eye, 0) / -rows,
+            ).astype(np.float32) * self._tile_size
+        distances[~np.isfinite(distances)] = 0
+
+        cells = self._grid.solid.size
+        rows = floor * cells
+        if self._shades is not None:
+            rows += self._shades.band_array(distances) * (2 * cells)
+
+        # world position of every pixel
+        dirs = gen_column_dirs(forward, self._plane).astype(np.float32)
+        indices = self._grid.flat_indices(
+            pos[0] + dirs[:, 0, None] * distances[None, :],
+            pos[1] + dirs[:, 1, None] * distances[None, :],
+        )
+        indices += rows[None, :]
+
+        view = pg.surfarray.pixels2d(surf)
+        np.take(self._table, indices, out=view, mode='clip')
+        del view # unlocks surf
@@ -0,0 +1,223 @@
+from typing import Self
+from typing import Optional
+
+import numpy as np
+
+
+def _gen_signature(data: dict) -> Optional[tuple]:
+    rect = data.get('rect')
+    semitile = data.get('semitile')
+    if rect is None and semitile is None:
+        return None
+    return (
+        None if rect is None else tuple(rect),
+        None if semitile is None else (
+            semitile['axis'], tuple(semitile['pos']), semitile['width'],
+        ),
+    )
+
+
+# Edge segments and outward normals of rect / semitile tiles, packed in
+# fixed size rows so a batch of rays can be tested against them at once
+# A semitile on its own is a single line; with a rect it clips the rect
+# along its axis (sliding doors)
+# Rows are only rebuilt when a tile's rect / semitile actually changes
+class TileGeometry(object):
+
+    _MAX_SEGMENTS = 4
+    _EPSILON = 1e-9
+
+    def __init__(self: Self, capacity: int=16) -> None:
+        self._segments = np.zeros(
+            (capacity, self._MAX_SEGMENTS, 4), dtype=np.float64,
+        )
+        self._normals = np.zeros(
+            (capacity, self._MAX_SEGMENTS, 2), dtype=np.float64,
+        )
+        self._counts = np.zeros(capacity, dtype=np.intp)
+        # left, top, right, bottom of all segments (for box collisions)
+        self._bounds = np.zeros((capacity, 4), dtype=np.float64)
+        self._rows = {} # tile: row
+        self._signatures = {} # tile: signature
+        self._free = list(range(capacity - 1, -1, -1))
+        self._builds = 0
+
+    # (rows, segments, 4) of x0, y0, x1, y1 in world space
+    @property
+    def segments(self: Self) -> np.ndarray:
+        return self._segments
+
+    @property
+    def normals(self: Self) -> np.ndarray:
+        return self._normals
+
+    @property
+    def counts(self: Self) -> np.ndarray:
+        return self._counts
+
+    # rows without segments have inverted bounds so nothing overlaps them
+    @property
+    def bounds(self: Self) -> np.ndarray:
+        return self._bounds
+
+    # number of row rebuilds so far (for profiling)
+    @property
+    def builds(self: Self) -> int:
+        return self._builds
+
+    def __len__(self: Self) -> int:
+        return len(self._rows)
+
+    def row(self: Self, tile: tuple[int, int]) -> int:
+        return self._rows.get(tile, -1)
+
+    def clear(self: Self) -> None:
+        self._counts[:] = 0
+        self._rows = {}
+        self._signatures = {}
+        self._free = list(range(len(self._counts) - 1, -1, -1))
+
+    def remove(self: Self, tile: tuple[int, int]) -> None:
+        row = self._rows.pop(tile, None)
+        if row is not None:
+            self._signatures.pop(tile)
+            self._counts[row] = 0
+            self._free.append(row)
+
+    # returns the tile's row or -1 if it has no thin geometry
+    def set(self: Self, tile: tuple[int, int], data: Optional[dict]) -> int:
+        signature = None if data is None else _gen_signature(data)
+        if signature is None:
+            self.remove(tile)
+            return -1
+        row = self._rows.get(tile)
+        if row is not None and self._signatures[tile] == signature:
+            return row
+        if row is None:
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self._rows[tile] = row
+        self._signatures[tile] = signature
+        self._build(row, tile, *signature)
+        return row
+
+    def _grow(self: Self) -> None:
+        capacity = len(self._counts)
+        self._segments = np.concatenate(
+            (self._segments, np.zeros_like(self._segments)),
+        )
+        self._normals = np.concatenate(
+            (self._normals, np.zeros_like(self._normals)),
+        )
+        self._counts = np.concatenate(
+            (self._counts, np.zeros_like(self._counts)),
+        )
+        self._bounds = np.concatenate(
+            (self._bounds, np.zeros_like(self._bounds)),
+        )
+        self._free.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def _build(self: Self,
+               row: int,
+               tile: tuple[int, int],
+               rect: Optional[tuple],
+               semitile: Optional[tuple]) -> None:
+
+        segments = []
+        if rect is None:
+            axis, pos, width = semitile
+            # line along the axis
+            if axis:
+                start, end = max(pos[1], 0), min(pos[1] + width, 1)
+                if start < end:
+                    segments.append(((pos[0], start, pos[0], end), (1, 0)))
+            else:
+                start, end = max(pos[0], 0), min(pos[0] + width, 1)
+                if start < end:
+                    segments.append(((start, pos[1], end, pos[1]), (0, 1)))
+        else:
+            left, top, right, bottom = (
+                rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3],
+            )
+            if semitile is not None:
+                axis, pos, width = semitile
+                if axis:
+                    top = max(top, pos[1])
+                    bottom = min(bottom, pos[1] + width)
+                else:
+                    left = max(left, pos[0])
+                    right = min(right, pos[0] + width)
+            if left < right and top < bottom:
+                segments = [
+                    ((left, top, right, top), (0, -1)),
+                    ((right, top, right, bottom), (1, 0)),
+                    ((left, bottom, right, bottom), (0, 1)),
+                    ((left, top, left, bottom), (-1, 0)),
+                ]
+
+        for dex, (segment, normal) in enumerate(segments):
+            self._segments[row, dex] = (
+                tile[0] + segment[0],
+                tile[1] + segment[1],
+                tile[0] + segment[2],
+                tile[1] + segment[3],
+            )
+            self._normals[row, dex] = normal
+        self._counts[row] = len(segments)
+        if segments:
+            points = self._segments[row, :len(segments)].reshape(-1, 2)
+            self._bounds[row, :2] = points.min(axis=0)
+            self._bounds[row, 2:] = points.max(axis=0)
+        else:
+            self._bounds[row] = (np.inf, np.inf, -np.inf, -np.inf)
+        self._builds += 1
+
+    # Nearest hit of every ray against its row's geometry with
+    # lower <= t <= upper; rays with row -1 never hit
+    # Every row is one axis aligned box (a semitile line is a box with no
+    # width) so this is a slab test on the row's bounds, O(rays) instead of
+    # testing every segment
+    # returns (hit, distances, normals)
+    def intersect(self: Self,
+                  rows: np.ndarray,
+                  origins: np.ndarray,
+                  dirs: np.ndarray,
+                  lower: np.ndarray,
+                  upper: np.ndarray) -> tuple:
+
+        bounds = self._bounds[rows]
+        # a ray parallel to a slab gets -inf / inf when it is inside it,
+        # the same sign twice when outside and nan exactly on a line, which
+        # fails every comparison below so it misses like a parallel segment
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1 / dirs
+            near = (bounds[:, :2] - origins) * inverse
+            far = (bounds[:, 2:] - origins) * inverse
+            entries = np.minimum(near, far)
+            exits = np.maximum(near, far)
+            axes = (entries[:, 1] > entries[:, 0]).view(np.int8)
+            entered = np.maximum(entries[:, 0], entries[:, 1])
+            left = np.minimum(exits[:, 0], exits[:, 1])
+            # from inside the box the ray hits the side it leaves through
+            # (a box flush with the tile's side is entered right at lower,
+            # give or take rounding)
+            inside = entered < lower - self._EPSILON
+            distances = np.where(inside, left, np.maximum(entered, lower))
+            hit = (
+                (self._counts[rows] > 0)
+                & (entered <= left)
+                & (distances >= lower)
+                & (distances <= upper)
+            )
+        if inside.any():
+            axes = np.where(
+                inside, (exits[:, 1] < exits[:, 0]).view(np.int8), axes,
+            )
+        distances[~hit] = np.inf
+        picked = np.arange(len(rows))
+        normals = np.zeros((len(rows), 2))
+        normals[picked, axes] = np.where(inside, 1, -1) * np.sign(
+            dirs[picked, axes],
+        )
+        return (hit, distances, normals)
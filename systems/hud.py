@@ -0,0 +1,177 @@
+from typing import Self
+from typing import Callable
+from typing import Optional
+
+import pygame as pg
+from pygame.typing import Point
+from pygame.typing import ColorLike
+
+from systems.text import TEXT
+
+
+# value -> surface of text, for dynamic elements
+def text_renderer(font: pg.Font,
+                  color: ColorLike=(255, 255, 255),
+                  fmt: str='{}') -> Callable:
+    def render(value: object) -> pg.Surface:
+        return TEXT.render(font, fmt.format(value), 1, color)
+    return render
+
+
+# HUD kept on its own transparent layer that is only redrawn where it
+# changed
+# Static elements are drawn once, dynamic elements have a getter that is
+# polled every update() and are only re-rendered when what it returns
+# changes (by ==), images are surfaces (a weapon sprite) scaled once per
+# surface and scale
+# render() is a single blit of the part of the layer elements cover
+class RetainedHUD(object):
+    def __init__(self: Self, size: Point) -> None:
+        self._layer = pg.Surface(size, pg.SRCALPHA)
+        self._elements = {} # name: element (drawn in insertion order)
+        self._dirty = [] # rects of the layer to redraw
+        self._bounds = pg.Rect(0, 0, 0, 0) # union of every element
+        self._scaled = {} # (surface, scale): scaled surface
+        self._redraws = 0
+
+    @property
+    def layer(self: Self) -> pg.Surface:
+        return self._layer
+
+    @property
+    def names(self: Self) -> list[str]:
+        return list(self._elements)
+
+    # elements re-rendered so far
+    @property
+    def redraws(self: Self) -> int:
+        return self._redraws
+
+    def _add(self: Self,
+             name: str,
+             pos: Point,
+             anchor: str,
+             getter: Optional[Callable],
+             render: Optional[Callable],
+             surf: Optional[pg.Surface]) -> None:
+        self.remove(name)
+        element = {
+            'pos': tuple(pos),
+            'anchor': anchor,
+            'getter': getter,
+            'render': render,
+            'value': None,
+            'surf': None,
+            'rect': pg.Rect(0, 0, 0, 0),
+        }
+        self._elements[name] = element
+        if surf is None:
+            self._refresh(element, getter())
+        else:
+            self._place(element, surf)
+
+    # anchor is a pg.Rect attribute name (topleft, center, midbottom...)
+    def static(self: Self,
+               name: str,
+               surf: pg.Surface,
+               pos: Point,
+               anchor: str='topleft') -> None:
+        self._add(name, pos, anchor, None, None, surf)
+
+    def dynamic(self: Self,
+                name: str,
+                getter: Callable,
+                render: Callable,
+                pos: Point,
+                anchor: str='topleft') -> None:
+        self._add(name, pos, anchor, getter, render, None)
+
+    # getter returns a surface (or None to hide it)
+    def image(self: Self,
+              name: str,
+              getter: Callable,
+              pos: Point,
+              scale: float=1,
+              anchor: str='topleft') -> None:
+        def render(surf: Optional[pg.Surface]) -> Optional[pg.Surface]:
+            if surf is None:
+                return None
+            scaled = self._scaled.get((surf, scale))
+            if scaled is None:
+                scaled = self._scaled[surf, scale] = pg.transform.scale_by(
+                    surf, scale,
+                )
+            return scaled
+        self._add(name, pos, anchor, getter, render, None)
+
+    def remove(self: Self, name: str) -> None:
+        element = self._elements.pop(name, None)
+        if element is not None and element['rect']:
+            self._dirty.append(element['rect'])
+            self._update_bounds()
+
+    def clear(self: Self) -> None:
+        self._elements = {}
+        self._scaled = {}
+        self._dirty = [self._layer.get_rect()]
+        self._bounds = pg.Rect(0, 0, 0, 0)
+
+    def _update_bounds(self: Self) -> None:
+        rects = [
+            element['rect'] for element in self._elements.values()
+            if element['rect']
+        ]
+        self._bounds = rects[0].unionall(rects[1:]) if rects else pg.Rect(
+            0, 0, 0, 0,
+        )
+
+    def _place(self: Self,
+               element: dict,
+               surf: Optional[pg.Surface]) -> None:
+        old = element['rect']
+        element['surf'] = surf
+        if surf is None:
+            rect = pg.Rect(element['pos'], (0, 0))
+        else:
+            rect = surf.get_rect(**{element['anchor']: element['pos']})
+        element['rect'] = rect
+        if old:
+            self._dirty.append(old)
+        if rect:
+            self._dirty.append(rect)
+        if old != rect:
+            self._update_bounds()
+        self._redraws += 1
+
+    def _refresh(self: Self, element: dict, value: object) -> None:
+        element['value'] = value
+        self._place(element, element['render'](value))
+
+    # polls the getters, re-rendering elements whose value changed
+    def update(self: Self) -> None:
+        for element in self._elements.values():
+            getter = element['getter']
+            if getter is None:
+                continue
+            value = getter()
+            if value != element['value']:
+                self._refresh(element, value)
+
+    def _redraw(self: Self) -> None:
+        layer = self._layer
+        for rect in self._dirty:
+            layer.set_clip(rect)
+            layer.fill((0, 0, 0, 0))
+            for element in self._elements.values():
+                if element['surf'] is not None and (
+                    element['rect'].colliderect(rect)
+                ):
+                    layer.blit(element['surf'], element['rect'])
+        layer.set_clip(None)
+        self._dirty = []
+
+    def render(self: Self, surf: pg.Surface) -> None:
+        if self._dirty:
+            self._redraw()
+        if self._bounds:
+            surf.blit(self._layer, self._bounds, self._bounds)
@@ -0,0 +1,94 @@
+from typing import Self
+
+import pygame as pg
+
+
+# Actions bound to keys (the settings' keys dict, kept by reference so
+# remapping it just works)
+# Bindings are compiled into (key, action bits) pairs and poll() turns the
+# keyboard into one int per tick, so checking an action is a bit test
+# Mouse motion isn't read per event, look() takes everything that moved
+# since the last call and is meant to be called right before rendering
+class InputMap(object):
+    def __init__(self: Self, bindings: dict) -> None:
+        self._bindings = bindings
+        self._layout = None
+        self._held = 0
+        self._pressed = 0
+        self._released = 0
+        self._compile()
+
+    @property
+    def bindings(self: Self) -> dict:
+        return self._bindings
+
+    @property
+    def bits(self: Self) -> dict:
+        return self._bits
+
+    # bitfields of this tick
+    @property
+    def state(self: Self) -> int:
+        return self._held
+
+    @property
+    def pressed_state(self: Self) -> int:
+        return self._pressed
+
+    @property
+    def released_state(self: Self) -> int:
+        return self._released
+
+    def _compile(self: Self) -> None:
+        self._layout = tuple(self._bindings.items())
+        self._bits = {
+            action: 1 << dex for dex, action in enumerate(self._bindings)
+        }
+        keys = {} # key: bits of every action on it
+        for action, key in self._layout:
+            keys[key] = keys.get(key, 0) | self._bits[action]
+        self._keys = keys
+        self._table = tuple(keys.items())
+
+    def rebind(self: Self, action: str, key: int) -> None:
+        self._bindings[action] = key
+        self._compile()
+
+    # snapshot of the keyboard, once per tick
+    def poll(self: Self) -> None:
+        if tuple(self._bindings.items()) != self._layout:
+            self._compile()
+        pressed = pg.key.get_pressed()
+        held = 0
+        for key, bits in self._table:
+            if pressed[key]:
+                held |= bits
+        self._pressed = held & ~self._held
+        self._released = self._held & ~held
+        self._held = held
+
+    def held(self: Self, action: str) -> bool:
+        return bool(self._held & self._bits[action])
+
+    def pressed(self: Self, action: str) -> bool:
+        return bool(self._pressed & self._bits[action])
+
+    def released(self: Self, action: str) -> bool:
+        return bool(self._released & self._bits[action])
+
+    # 1, 0 or -1
+    def axis(self: Self, positive: str, negative: str) -> int:
+        return (
+            bool(self._held & self._bits[positive])
+            - bool(self._held & self._bits[negative])
+        )
+
+    # whether a key event's key is bound to action
+    def matches(self: Self, key: int, action: str) -> bool:
+        return bool(self._keys.get(key, 0) & self._bits[action])
+
+    # mouse movement since the last call, pumping first so that motion
+    # that arrived during the tick is included
+    def look(self: Self) -> tuple[int, int]:
+        pg.event.pump()
+        return pg.mouse.get_rel()
@@ -0,0 +1,299 @@
+import copy
+import math
+from collections import deque
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+from pygame.typing import Point
+
+from systems.tiles import TileGrid
+from systems.tiles import parse_tile_key
+
+
+def gen_light(pos: tuple,
+              elevation: Real=0.5,
+              intensity: Real=1,
+              radius: Real=6) -> dict:
+    return {
+        'pos': (pos[0], pos[1]),
+        'elevation': elevation,
+        'intensity': intensity,
+        'radius': radius,
+    }
+
+
+def gen_mark_lights(marks: dict,
+                    mark: int,
+                    elevation: Real=0.5,
+                    intensity: Real=1,
+                    radius: Real=6) -> list[dict]:
+    lights = []
+    for key, value in marks.items():
+        if value == mark:
+            x, y = parse_tile_key(key)
+            lights.append(
+                gen_light((x + 0.5, y + 0.5), elevation, intensity, radius),
+            )
+    return lights
+
+
+# Light from one point light on the cells in its radius
+# Each cell is lit at its closest point to the light (so walls get their
+# facing side), falloff is (1 - distance / radius) ** 2
+# A light ray is stopped by any other solid cell whose
+# [elevation, elevation + height] contains the ray's height there
+# Rect / semitile tiles don't stop light since doors move
+# returns (window slices, window amounts) or None if out of the grid
+def light_window(grid: TileGrid,
+                 light: dict,
+                 samples_per_tile: int=4) -> Optional[tuple]:
+
+    origin = grid.origin
+    shape = grid.shape
+    lx, ly = light['pos']
+    lz = light.get('elevation', 0.5)
+    radius = light.get('radius', 6)
+    intensity = light.get('intensity', 1)
+
+    # cells in range (grid indices)
+    x0 = max(math.floor(lx - radius) - origin[0], 0)
+    y0 = max(math.floor(ly - radius) - origin[1], 0)
+    x1 = min(math.floor(lx + radius) - origin[0] + 1, shape[0])
+    y1 = min(math.floor(ly + radius) - origin[1] + 1, shape[1])
+    if x0 >= x1 or y0 >= y1:
+        return None
+    gx, gy = np.meshgrid(
+        np.arange(x0, x1), np.arange(y0, y1), indexing='ij',
+    )
+    gx = gx.ravel()
+    gy = gy.ravel()
+    solid = grid.solid[gx, gy]
+    bottom = grid.elevation
+    top = grid.elevation + grid.height
+
+    # closest point of every cell
+    tx = np.clip(lx, gx + origin[0], gx + origin[0] + 1)
+    ty = np.clip(ly, gy + origin[1], gy + origin[1] + 1)
+    tz = np.where(solid, np.clip(lz, bottom[gx, gy], top[gx, gy]), 0)
+    distances = np.sqrt((tx - lx) ** 2 + (ty - ly) ** 2 + (tz - lz) ** 2)
+    amounts = intensity * np.clip(1 - distances / radius, 0, 1) ** 2
+
+    # line of sight (samples, cells)
+    samples = max(math.ceil(radius * samples_per_tile), 1)
+    fractions = (np.arange(samples) + 0.5)[:, None] / samples
+    sx = np.floor(lx + (tx - lx) * fractions).astype(np.intp) - origin[0]
+    sy = np.floor(ly + (ty - ly) * fractions).astype(np.intp) - origin[1]
+    sz = lz + (tz - lz) * fractions
+    np.clip(sx, 0, shape[0] - 1, out=sx)
+    np.clip(sy, 0, shape[1] - 1, out=sy)
+    target = (sx == gx) & (sy == gy)
+    blocked = (
+        grid.solid[sx, sy]
+        & (grid.rows[sx, sy] < 0)
+        & (grid.height[sx, sy] > 0)
+        & ~target
+        & (sz >= bottom[sx, sy])
+        & (sz <= top[sx, sy])
+    ).any(axis=0)
+    amounts[blocked] = 0
+    return (
+        (slice(x0, x1), slice(y0, y1)),
+        amounts.reshape(x1 - x0, y1 - y0).astype(np.float32),
+    )
+
+
+# Light reaching every cell from point lights
+def bake_lights(grid: TileGrid,
+                lights: list[dict],
+                samples_per_tile: int=4) -> np.ndarray:
+
+    light = np.zeros(grid.shape, dtype=np.float32)
+    for source in lights:
+        window = light_window(grid, source, samples_per_tile)
+        if window is not None:
+            light[window[0]] += window[1]
+    return light
+
+
+# darkness (as used by the camera) of baked light
+def light_to_darkness(light: np.ndarray, ambient: Real=1) -> np.ndarray:
+    return ambient * (1 - np.clip(light, 0, 1))
+
+
+# Returns a copy of the tilemap with baked darkness on every tile
+# keep leaves hand authored darkness alone
+def bake_tilemap(tilemap: dict,
+                 lights: list[dict],
+                 ambient: Real=1,
+                 keep: bool=0,
+                 samples_per_tile: int=4) -> dict:
+
+    grid = TileGrid(tilemap)
+    darkness = light_to_darkness(
+        bake_lights(grid, lights, samples_per_tile), ambient,
+    )
+    baked = {}
+    for key, data in tilemap.items():
+        data = copy.deepcopy(data)
+        if not keep or data.get('darkness') is None:
+            index = grid.index(parse_tile_key(key))
+            data['darkness'] = round(float(darkness[index]), 3)
+        baked[key] = data
+    return baked
+
+
+# Short lived lights (muzzle flashes, explosions) on top of the static
+# (baked or authored) darkness
+# Every light keeps the window it lit so adding, fading and removing it
+# only touches the cells in its radius
+# multiplier is what the static darkness of every tile is multiplied by
+# Renderers that bake the multiplier (the floor table) follow version and
+# only redo the windows changes() reports since the version they saw
+class LightGrid(object):
+    def __init__(self: Self,
+                 grid: TileGrid,
+                 ambient: Real=1,
+                 samples_per_tile: int=2,
+                 history: int=256) -> None:
+
+        self._grid = grid
+        self._ambient = ambient
+        self._samples_per_tile = samples_per_tile
+        # id: [light, slices, amounts, duration, timer, strength]
+        self._lights = {}
+        self._next_id = 0
+        self._version = 0
+        self._changes = deque(maxlen=history) # (version, slices)
+        self._reset()
+
+    @property
+    def lights(self: Self) -> dict:
+        return self._lights
+
+    @property
+    def light(self: Self) -> np.ndarray:
+        return self._light
+
+    @property
+    def multiplier(self: Self) -> np.ndarray:
+        self._check_layout()
+        return self._multiplier
+
+    @property
+    def version(self: Self) -> int:
+        return self._version
+
+    # windows whose multiplier changed after version, None if they aren't
+    # all remembered anymore (or the grid was reset) so everything is stale
+    def changes(self: Self, version: int) -> Optional[list[tuple]]:
+        self._check_layout()
+        if version == self._version:
+            return []
+        if not self._changes or self._changes[0][0] > version + 1:
+            return None
+        return [
+            slices for changed, slices in self._changes if changed > version
+        ]
+
+    # multiplier at every position (positions off the grid are unlit)
+    def multiplier_at(self: Self, positions: np.ndarray) -> np.ndarray:
+        self._check_layout()
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        return self._multiplier[
+            self._grid.indices(positions[:, 0], positions[:, 1])
+        ]
+
+    # full static * multiplier product (costs the whole map)
+    @property
+    def darkness(self: Self) -> np.ndarray:
+        static = np.where(
+            np.isnan(self._grid.darkness), self._ambient, self._grid.darkness,
+        )
+        return static * self._multiplier
+
+    def darkness_at(self: Self, pos: Point) -> float:
+        index = self._grid.index(pos)
+        if index is None:
+            return self._ambient
+        static = self._grid.darkness[index]
+        if np.isnan(static):
+            static = self._ambient
+        return float(static * self._multiplier[index])
+
+    def _reset(self: Self) -> None:
+        self._layout = (self._grid.origin, self._grid.shape)
+        self._light = np.zeros(self._grid.shape, dtype=np.float32)
+        self._multiplier = np.ones(self._grid.shape, dtype=np.float32)
+        self._version += 1
+        self._changes.clear()
+
+    def _check_layout(self: Self) -> None:
+        # the grid grew so every window is stale
+        if self._layout == (self._grid.origin, self._grid.shape):
+            return
+        self._reset()
+        for data in self._lights.values():
+            window = light_window(
+                self._grid, data[0], self._samples_per_tile,
+            )
+            data[1], data[2] = (None, None) if window is None else window
+            self._stamp(data, data[5])
+
+    def _stamp(self: Self, data: list, strength: Real) -> None:
+        slices, amounts = data[1], data[2]
+        if slices is None:
+            return
+        self._light[slices] += amounts * strength
+        self._multiplier[slices] = 1 - np.clip(self._light[slices], 0, 1)
+        self._version += 1
+        self._changes.append((self._version, slices))
+
+    # duration is in game ticks (None lasts until removed)
+    def add(self: Self,
+            pos: Point,
+            radius: Real=4,
+            intensity: Real=1,
+            duration: Optional[Real]=None,
+            elevation: Real=0.5) -> int:
+
+        self._check_layout()
+        light = {
+            'pos': (pos[0], pos[1]),
+            'elevation': elevation,
+            'intensity': intensity,
+            'radius': radius,
+        }
+        window = light_window(self._grid, light, self._samples_per_tile)
+        slices, amounts = (None, None) if window is None else window
+        data = [light, slices, amounts, duration, 0, 1]
+        light_id = self._next_id
+        self._next_id += 1
+        self._lights[light_id] = data
+        self._stamp(data, 1)
+        return light_id
+
+    def remove(self: Self, light_id: int) -> None:
+        data = self._lights.pop(light_id, None)
+        if data is not None:
+            self._check_layout()
+            self._stamp(data, -data[5])
+
+    def clear(self: Self) -> None:
+        self._lights = {}
+        self._reset()
+
+    # fades lights with a duration linearly and removes finished ones
+    def update(self: Self, rel_game_speed: Real) -> None:
+        self._check_layout()
+        for light_id, data in list(self._lights.items()):
+            if data[3] is None:
+                continue
+            data[4] += rel_game_speed
+            strength = max(1 - data[4] / data[3], 0)
+            if strength <= 0:
+                self.remove(light_id)
+                continue
+            self._stamp(data, strength - data[5])
+            data[5] = strength
@@ -0,0 +1,338 @@
+import gc
+import sys
+import time
+import types
+import tracemalloc
+from collections import deque
+from numbers import Real
+from typing import Self
+from typing import Callable
+from typing import Optional
+
+import numpy as np
+import pygame as pg
+
+# never followed (code, classes, modules are shared by everything)
+_OPAQUE = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.CodeType,
+    types.FrameType,
+)
+
+
+def surf_bytes(surf: pg.Surface) -> int:
+    return surf.get_pitch() * surf.get_height()
+
+
+def sound_bytes(sound: pg.mixer.Sound) -> int:
+    mixer = pg.mixer.get_init()
+    if mixer is None:
+        return sys.getsizeof(sound)
+    frequency, size, channels = mixer
+    return round(sound.get_length() * frequency) * abs(size) // 8 * channels
+
+
+# bytes held by obj and everything it references, objects whose id is in
+# seen are skipped (and everything counted is added to it)
+# Pixel, sample and array buffers are counted (views of arrays aren't)
+def deep_size(obj: object, seen: Optional[set]=None) -> int:
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _OPAQUE):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            total += sys.getsizeof(obj) if obj.base is None else 0
+            if obj.dtype == object:
+                stack.extend(obj.ravel())
+            continue
+        if isinstance(obj, pg.Surface):
+            total += sys.getsizeof(obj) + surf_bytes(obj)
+            continue
+        if isinstance(obj, pg.mixer.Sound):
+            total += sys.getsizeof(obj) + sound_bytes(obj)
+            continue
+        total += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, bytearray, int, float, complex)):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, deque):
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        for slots in (
+            getattr(cls, '__slots__', ()) for cls in type(obj).__mro__
+        ):
+            for slot in (slots, ) if isinstance(slots, str) else slots:
+                value = getattr(obj, slot, None)
+                if value is not None:
+                    stack.append(value)
+    return total
+
+
+# Bytes held per subsystem
+# Subsystems are registered as functions returning their root object(s)
+# so the report follows the game as levels change
+# Every root is a boundary for the others: a subsystem referencing another
+# one (an entity pointing at the level) doesn't count it, and boundaries
+# adds more objects nobody should walk through (the game itself)
+class MemoryReport(object):
+    def __init__(self: Self, boundaries: tuple=()) -> None:
+        self._subsystems = {} # name: getter
+        self._boundaries = list(boundaries)
+
+    @property
+    def subsystems(self: Self) -> list[str]:
+        return list(self._subsystems)
+
+    def add(self: Self, name: str, getter: Callable) -> None:
+        self._subsystems[name] = getter
+
+    def remove(self: Self, name: str) -> None:
+        self._subsystems.pop(name, None)
+
+    def add_boundary(self: Self, obj: object) -> None:
+        self._boundaries.append(obj)
+
+    # {name: bytes} biggest first, 'total' counts shared objects once
+    def measure(self: Self) -> dict:
+        roots = {name: getter() for name, getter in self._subsystems.items()}
+        stops = {id(obj) for obj in self._boundaries}
+        stops.update(id(root) for root in roots.values())
+        sizes = {}
+        for name, root in roots.items():
+            sizes[name] = deep_size(root, stops - {id(root)})
+        sizes = dict(sorted(sizes.items(), key=lambda item: -item[1]))
+        total = 0
+        seen = set(stops)
+        for root in roots.values():
+            seen.discard(id(root))
+            total += deep_size(root, seen)
+        sizes['total'] = total
+        return sizes
+
+    def format(self: Self) -> str:
+        return '\n'.join(
+            f'{size / 2 ** 20:10.2f} MiB  {name}'
+            for name, size in self.measure().items()
+        )
+
+
+# Runs garbage collection when the frame has time to spare instead of
+# whenever the allocator decides to
+# While enabled, automatic collection is off and collect() is called once
+# a frame with the ms left before the frame is due
+# Collections are generational like the automatic ones (a generation is
+# due when its count passes gc's threshold) and only run when their
+# slowest run so far fits the slack, unless the count has grown way past
+# the threshold (overdue) in which case they run anyway
+class GCScheduler(object):
+    def __init__(self: Self,
+                 budget: Real=1,
+                 overdue: Real=8) -> None:
+        self._budget = budget # most ms a frame spends collecting
+        self._overdue = overdue
+        self._enabled = 0
+        self._frozen = 0
+        self._costs = [0, 0, 0] # slowest ms per generation
+        self._stats = {
+            'collections': [0, 0, 0],
+            'collected': 0,
+            'total': 0, # ms
+            'last': 0, # ms
+        }
+
+    @property
+    def enabled(self: Self) -> bool:
+        return self._enabled
+
+    @property
+    def budget(self: Self) -> Real:
+        return self._budget
+
+    @budget.setter
+    def budget(self: Self, value: Real) -> None:
+        self._budget = value
+
+    @property
+    def stats(self: Self) -> dict:
+        return self._stats
+
+    # freeze moves everything alive now (level data, textures) out of the
+    # collector's sight so collections only walk what gameplay allocates
+    def enable(self: Self, freeze: bool=1) -> None:
+        if self._enabled:
+            return
+        gc.collect()
+        if freeze:
+            gc.freeze()
+            self._frozen = 1
+        gc.disable()
+        self._enabled = 1
+
+    def disable(self: Self) -> None:
+        if not self._enabled:
+            return
+        if self._frozen:
+            gc.unfreeze()
+            self._frozen = 0
+        gc.enable()
+        self._enabled = 0
+
+    def _due(self: Self) -> int:
+        counts = gc.get_count()
+        thresholds = gc.get_threshold()
+        # oldest due generation (younger ones are collected with it)
+        for generation in (2, 1, 0):
+            if thresholds[generation] and (
+                counts[generation] >= thresholds[generation]
+            ):
+                return generation
+        return -1
+
+    def collect(self: Self, slack: Real) -> None:
+        self._stats['last'] = 0
+        if not self._enabled:
+            return
+        generation = self._due()
+        if generation < 0:
+            return
+        threshold = gc.get_threshold()[generation]
+        overdue = gc.get_count()[generation] >= threshold * self._overdue
+        if (not overdue
+            and self._costs[generation] > min(slack, self._budget)):
+            # try a younger generation that fits
+            generation = next(
+                (
+                    younger for younger in range(generation - 1, -1, -1)
+                    if self._costs[younger] <= min(slack, self._budget)
+                ),
+                -1,
+            )
+            if generation < 0:
+                return
+        start = time.perf_counter()
+        self._stats['collected'] += gc.collect(generation)
+        cost = (time.perf_counter() - start) * 1000
+        self._costs[generation] = max(self._costs[generation], cost)
+        self._stats['collections'][generation] += 1
+        self._stats['total'] += cost
+        self._stats['last'] = cost
+
+
+# tracemalloc based allocation counts per source line
+# frame() diffs the memory held since the last frame, so it counts what a
+# line left allocated (or for the collector) by the end of the frame
+# report() lists the lines that grew the most over every tracked frame
+class AllocationTracker(object):
+    def __init__(self: Self, depth: int=1) -> None:
+        self._depth = depth
+        self._snapshot = None
+        self._frames = 0
+        self._lines = {} # (file, line): [bytes, count]
+        # traced bytes at the start of the frame, summed and worst peaks
+        # above it (temporaries freed within the frame included)
+        self._base = 0
+        self._peaks = 0
+        self._worst = 0
+        self._filters = (
+            tracemalloc.Filter(0, tracemalloc.__file__),
+            tracemalloc.Filter(0, __file__),
+            tracemalloc.Filter(0, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(0, '<unknown>'),
+        )
+
+    @property
+    def tracking(self: Self) -> bool:
+        return tracemalloc.is_tracing()
+
+    @property
+    def frames(self: Self) -> int:
+        return self._frames
+
+    # mean bytes allocated on top of the frame's start at its peak
+    @property
+    def peak(self: Self) -> float:
+        return self._peaks / max(self._frames, 1)
+
+    @property
+    def worst(self: Self) -> int:
+        return self._worst
+
+    def start(self: Self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self._depth)
+        self._snapshot = tracemalloc.take_snapshot().filter_traces(
+            self._filters,
+        )
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+
+    def stop(self: Self) -> None:
+        tracemalloc.stop()
+        self._snapshot = None
+
+    def clear(self: Self) -> None:
+        self._frames = 0
+        self._lines = {}
+        self._peaks = 0
+        self._worst = 0
+
+    # call once at the end of every frame
+    # the peak covers everything the frame allocated, the lines only what
+    # it kept (snapshots can't see memory freed between them)
+    def frame(self: Self) -> None:
+        if self._snapshot is None:
+            return
+        peak = tracemalloc.get_traced_memory()[1] - self._base
+        self._peaks += peak
+        self._worst = max(self._worst, peak)
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._filters)
+        for stat in snapshot.compare_to(self._snapshot, 'lineno'):
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            data = self._lines.setdefault(
+                (frame.filename, frame.lineno), [0, 0],
+            )
+            data[0] += stat.size_diff
+            data[1] += max(stat.count_diff, 0)
+        self._snapshot = snapshot
+        self._frames += 1
+        # after the snapshot so its own allocations aren't counted
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+
+    # [(file, line, bytes per frame, allocations per frame)], worst first
+    def report(self: Self, limit: int=20) -> list[tuple]:
+        frames = max(self._frames, 1)
+        lines = sorted(
+            self._lines.items(), key=lambda item: item[1][0], reverse=True,
+        )
+        return [
+            (filename, lineno, size / frames, count / frames)
+            for (filename, lineno), (size, count) in lines[:limit]
+        ]
+
+    def format_report(self: Self, limit: int=20) -> str:
+        lines = [
+            f'allocations over {self._frames} frames (per frame)',
+            f'peak {self.peak:.0f} B mean, {self._worst} B worst',
+            'retained:',
+        ]
+        for filename, lineno, size, count in self.report(limit):
+            lines.append(
+                f'{size:10.0f} B {count:8.1f}  {filename}:{lineno}',
+            )
+        return '\n'.join(lines)
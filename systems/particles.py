@@ -0,0 +1,247 @@
+import math
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+import pygame as pg
+from pygame.typing import Point
+
+from systems.tiles import TileGrid
+from systems.shading import ShadeTable
+from systems.lighting import LightGrid
+
+
+# Short lived particles (sparks, debris, blood) kept in fixed size arrays
+# Emitting writes over a ring so the oldest particles are replaced when
+# full and memory never grows past capacity
+# Particles are drawn as screen aligned squares into the pixel array,
+# tested per column against the wall depth
+class ParticleSystem(object):
+
+    _GRAVITY = 0.004
+
+    def __init__(self: Self,
+                 size: Point,
+                 fov: Real,
+                 tile_size: Real,
+                 shades: Optional[ShadeTable]=None,
+                 capacity: int=4096,
+                 drag: Real=0.95,
+                 bounce: Real=0.4,
+                 near: Real=0.05,
+                 max_pixels: int=4) -> None:
+
+        self._size = (int(size[0]), int(size[1]))
+        self._tile_size = tile_size
+        self._shades = shades
+        self._capacity = capacity
+        self._drag = drag
+        self._bounce = bounce
+        self._near = near
+        self._max_pixels = max_pixels # biggest particle side on screen
+        self._pos = np.zeros((capacity, 2))
+        self._velocity = np.zeros((capacity, 2))
+        self._elevation = np.zeros(capacity)
+        self._elevation_velocity = np.zeros(capacity)
+        self._age = np.zeros(capacity)
+        self._lifetime = np.zeros(capacity) # 0 is dead
+        self._color = np.zeros((capacity, 3), dtype=np.uint8)
+        self._radius = np.zeros(capacity) # in tiles
+        self._cursor = 0
+        self.fov = fov
+
+    @property
+    def fov(self: Self) -> Real:
+        return self._fov
+
+    @fov.setter
+    def fov(self: Self, value: Real) -> None:
+        self._fov = value
+        self._plane = math.tan(math.radians(value) / 2)
+
+    @property
+    def capacity(self: Self) -> int:
+        return self._capacity
+
+    @property
+    def alive(self: Self) -> np.ndarray:
+        return self._age < self._lifetime
+
+    @property
+    def count(self: Self) -> int:
+        return int(np.count_nonzero(self.alive))
+
+    @property
+    def bytes(self: Self) -> int:
+        return sum(array.nbytes for array in (
+            self._pos,
+            self._velocity,
+            self._elevation,
+            self._elevation_velocity,
+            self._age,
+            self._lifetime,
+            self._color,
+            self._radius,
+        ))
+
+    # count particles from pos in a cone of spread degrees around yaw
+    # speed and lifetime are per tick and vary randomly by up to variance
+    def emit(self: Self,
+             pos: Point,
+             elevation: Real,
+             count: int,
+             color: tuple=(255, 255, 255),
+             speed: Real=0.05,
+             lifetime: Real=30,
+             yaw: Real=0,
+             spread: Real=360,
+             up: Real=0.03,
+             radius: Real=0.02,
+             variance: Real=0.5,
+             rng: Optional[np.random.Generator]=None) -> None:
+
+        count = min(count, self._capacity)
+        if count <= 0:
+            return
+        rng = np.random.default_rng() if rng is None else rng
+        slots = (self._cursor + np.arange(count)) % self._capacity
+        self._cursor = int(slots[-1] + 1) % self._capacity
+        scale = 1 + rng.uniform(-variance, variance, (3, count))
+        radians = np.radians(
+            yaw + rng.uniform(-spread / 2, spread / 2, count),
+        )
+        self._pos[slots] = pos[0], pos[1]
+        self._velocity[slots, 0] = np.cos(radians) * speed * scale[0]
+        self._velocity[slots, 1] = np.sin(radians) * speed * scale[0]
+        self._elevation[slots] = elevation
+        self._elevation_velocity[slots] = up * scale[1]
+        self._age[slots] = 0
+        self._lifetime[slots] = lifetime * scale[2]
+        self._color[slots] = color
+        self._radius[slots] = radius
+
+    def clear(self: Self) -> None:
+        self._lifetime[:] = 0
+        self._age[:] = 0
+
+    # one pass over every live particle
+    # with a grid, particles bounce off the top of the tile under them and
+    # die inside solid tiles
+    def update(self: Self,
+               rel_game_speed: Real,
+               grid: Optional[TileGrid]=None) -> None:
+
+        live = np.flatnonzero(self._age < self._lifetime)
+        if not live.size:
+            return
+        self._age[live] += rel_game_speed
+        old_elevation = self._elevation[live]
+        self._velocity[live] *= self._drag ** rel_game_speed
+        self._elevation_velocity[live] -= self._GRAVITY * rel_game_speed
+        self._pos[live] += self._velocity[live] * rel_game_speed
+        self._elevation[live] += (
+            self._elevation_velocity[live] * rel_game_speed
+        )
+
+        # floor bounce
+        if grid is None:
+            floors = np.zeros(live.size)
+        else:
+            floors = grid.floors(
+                self._pos[live, 0], self._pos[live, 1], old_elevation,
+            )
+        below = self._elevation[live] < floors
+        landed = live[below]
+        self._elevation[landed] = floors[below]
+        self._elevation_velocity[landed] *= -self._bounce
+        self._velocity[landed] *= self._bounce
+
+        if grid is not None:
+            ix, iy = grid.indices(self._pos[live, 0], self._pos[live, 1])
+            z = self._elevation[live]
+            inside = (
+                grid.solid[ix, iy]
+                & (grid.rows[ix, iy] < 0)
+                & (z >= grid.elevation[ix, iy])
+                & (z <= grid.elevation[ix, iy] + grid.height[ix, iy])
+            )
+            self._lifetime[live[inside]] = 0
+
+    def render(self: Self,
+               surf: pg.Surface,
+               pos: Point,
+               forward: Point,
+               eye: Real,
+               horizon: Real,
+               depth: np.ndarray,
+               darkness: Real=1,
+               lights: Optional[LightGrid]=None) -> None:
+
+        live = np.flatnonzero(self._age < self._lifetime)
+        if not live.size:
+            return
+        width, height = self._size
+        # camera space
+        rel = self._pos[live] - pos
+        distances = rel[:, 0] * forward[0] + rel[:, 1] * forward[1]
+        offsets = rel[:, 1] * forward[0] - rel[:, 0] * forward[1]
+        ahead = distances > self._near
+        live = live[ahead]
+        distances = distances[ahead]
+        scales = self._tile_size / distances
+        xs = width / 2 * (1 + offsets[ahead] / (distances * self._plane))
+        ys = horizon * height - (self._elevation[live] - eye) * scales
+        sides = np.clip(
+            np.rint(self._radius[live] * 2 * scales), 1, self._max_pixels,
+        ).astype(np.intp)
+        xs = np.floor(xs - sides / 2).astype(np.intp)
+        ys = np.floor(ys - sides / 2).astype(np.intp)
+        shown = (
+            (xs + sides > 0) & (xs < width) & (ys + sides > 0) & (ys < height)
+        )
+        shown[shown] &= depth[np.clip(xs[shown], 0, width - 1)] > (
+            distances[shown]
+        )
+        if not shown.any():
+            return
+
+        # back to front so nearer particles end up on top
+        order = np.flatnonzero(shown)
+        order = order[np.argsort(-distances[order], kind='stable')]
+        live = live[order]
+        distances = distances[order]
+        xs = xs[order]
+        ys = ys[order]
+        sides = sides[order]
+        colors = self._color[live]
+        if self._shades is not None:
+            if lights is not None:
+                # every particle in the light of its tile
+                darkness = darkness * lights.multiplier_at(self._pos[live])
+            colors = self._shades.shade(colors, darkness, distances)
+
+        # every particle becomes sides ** 2 pixels, all sizes in one batch
+        # still back to front
+        counts = sides * sides
+        owners = np.repeat(np.arange(sides.size), counts)
+        steps = np.arange(owners.size) - np.repeat(
+            np.cumsum(counts) - counts, counts,
+        )
+        dx, dy = np.divmod(steps, sides[owners])
+        px = xs[owners] + dx
+        py = ys[owners] + dy
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        inside[inside] &= depth[px[inside]] > distances[owners[inside]]
+        px = px[inside]
+        py = py[inside]
+        owners = owners[inside]
+        # the nearest particle of a pixel is the last one on it, found
+        # explicitly since repeated indices in an assignment don't promise
+        # any order
+        nearest = px.size - 1 - np.unique(
+            (px * height + py)[::-1], return_index=True,
+        )[1]
+        pixels = pg.surfarray.pixels3d(surf)
+        pixels[px[nearest], py[nearest]] = colors[owners[nearest]]
+        del pixels
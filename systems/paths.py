@@ -0,0 +1,188 @@
+from numbers import Real
+from typing import Self
+from typing import Iterable
+from typing import Optional
+
+import numpy as np
+
+from systems.tiles import TileGrid
+
+
+# Steers entities along pathfinder paths
+# Paths are kept as given (goal first, next waypoint last) with a cursor
+# that walks down instead of popping, and the waypoint every follower is
+# heading to sits in one array so a tick is one vectorized pass
+# Waypoints flagged as elevated are climbed onto (the tile's top is read
+# from the grid every tick since tiles move)
+class PathFollower(object):
+    def __init__(self: Self,
+                 capacity: int=16,
+                 speed: Real=0.1,
+                 arrive: Real=0.075,
+                 reach: Real=0.1,
+                 climb: Real=0.25,
+                 fall: Real=-0.1) -> None:
+
+        self._speed = speed
+        self._arrive = arrive # velocity per tile left on the last waypoint
+        self._reach = reach
+        self._climb = climb # elevation velocity per unit below the top
+        self._fall = fall
+        self._capacity = 0
+        self._targets = np.zeros((0, 2))
+        self._tiles = np.zeros((0, 2), dtype=np.intp)
+        self._elevated = np.zeros(0, dtype=np.bool_)
+        self._last = np.zeros(0, dtype=np.bool_)
+        self._active = np.zeros(0, dtype=np.bool_)
+        # slot: [entity, path, cursor]
+        self._paths = []
+        self._slots = {} # entity: slot
+        self._free = []
+        self._grow(capacity)
+
+    @property
+    def followers(self: Self) -> list:
+        return list(self._slots)
+
+    def _grow(self: Self, capacity: int) -> None:
+        extra = capacity - self._capacity
+        if extra <= 0:
+            return
+        self._targets = np.concatenate((self._targets, np.zeros((extra, 2))))
+        self._tiles = np.concatenate(
+            (self._tiles, np.zeros((extra, 2), dtype=np.intp)),
+        )
+        for name in ('_elevated', '_last', '_active'):
+            setattr(self, name, np.concatenate(
+                (getattr(self, name), np.zeros(extra, dtype=np.bool_)),
+            ))
+        self._paths.extend([None, (), -1] for _ in range(extra))
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._capacity = capacity
+
+    # waypoints left (goal first) or () if not following
+    def remaining(self: Self, entity: object) -> tuple:
+        slot = self._slots.get(entity)
+        if slot is None:
+            return ()
+        path, cursor = self._paths[slot][1:]
+        return path[:cursor + 1]
+
+    def is_following(self: Self, entity: object) -> bool:
+        slot = self._slots.get(entity)
+        return slot is not None and bool(self._active[slot])
+
+    def _target(self: Self, slot: int) -> None:
+        path, cursor = self._paths[slot][1:]
+        if cursor < 0:
+            self._active[slot] = 0
+            return
+        tile, elevated = path[cursor]
+        self._targets[slot] = tile[0] + 0.5, tile[1] + 0.5
+        self._tiles[slot] = tile[0], tile[1]
+        self._elevated[slot] = bool(elevated)
+        self._last[slot] = cursor == 0
+        self._active[slot] = 1
+
+    # follows a new path, replacing the current one
+    # splice is for a path cut short by the pathfinder's node limit: if it
+    # ends on a waypoint still ahead on the current path the rest of the
+    # current path is kept after it (a full replan must not be spliced,
+    # the old route past its goal is stale)
+    def follow(self: Self,
+               entity: object,
+               path: Iterable,
+               splice: bool=0) -> None:
+
+        path = tuple((tuple(tile), elevated) for tile, elevated in path)
+        slot = self._slots.get(entity)
+        if slot is None:
+            if not self._free:
+                self._grow(self._capacity * 2)
+            slot = self._free.pop()
+            self._slots[entity] = slot
+        elif splice and path:
+            remaining = self.remaining(entity)
+            end = path[0][0]
+            for dex, (tile, elevated) in enumerate(remaining):
+                if tile == end:
+                    path = remaining[:dex] + path
+                    break
+        self._paths[slot] = [entity, path, len(path) - 1]
+        self._target(slot)
+
+    def stop(self: Self, entity: object) -> None:
+        slot = self._slots.pop(entity, None)
+        if slot is None:
+            return
+        self._paths[slot] = [None, (), -1]
+        self._active[slot] = 0
+        self._free.append(slot)
+
+    # steers every active follower (or only those in entities)
+    # entities can be {entity: ticks since it last thought} like
+    # ActivityMonitor.update returns, a follower keeps its velocity until
+    # it thinks again so steps are sized to cover that many ticks without
+    # going past the waypoint
+    def update(self: Self,
+               grid: TileGrid,
+               entities: Optional[Iterable | dict]=None) -> None:
+
+        active = self._active.copy()
+        elapsed = np.ones(self._capacity)
+        if entities is not None:
+            chosen = np.zeros(self._capacity, dtype=np.bool_)
+            for entity in entities:
+                slot = self._slots.get(entity)
+                if slot is not None:
+                    chosen[slot] = 1
+                    if isinstance(entities, dict):
+                        elapsed[slot] = entities[entity]
+            active &= chosen
+        slots = np.flatnonzero(active)
+        if not slots.size:
+            return
+        paths = self._paths
+        positions = np.array([paths[slot][0].pos for slot in slots])
+        elevations = np.array([paths[slot][0].elevation for slot in slots])
+        ticks = np.maximum(elapsed[slots], 1e-6)
+
+        # waypoints reached move on to the next one before steering
+        vectors = self._targets[slots] - positions
+        distances = np.hypot(vectors[:, 0], vectors[:, 1])
+        for slot in slots[distances < self._reach]:
+            paths[slot][2] -= 1
+            self._target(slot)
+        vectors = self._targets[slots] - positions
+        distances = np.hypot(vectors[:, 0], vectors[:, 1])
+
+        # never more than what reaches the waypoint in ticks
+        speeds = np.minimum(self._speed, distances / ticks)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocities = np.where(
+                distances[:, None] > 0,
+                vectors / distances[:, None] * speeds[:, None],
+                0,
+            )
+        last = self._last[slots]
+        velocities[last] = vectors[last] * np.minimum(
+            self._arrive, 1 / ticks[last],
+        )[:, None]
+
+        index = grid.indices(self._tiles[slots, 0], self._tiles[slots, 1])
+        tops = grid.elevation[index] + grid.height[index]
+        elevation_velocities = np.where(
+            self._elevated[slots],
+            (tops - elevations) * np.minimum(self._climb, 1 / ticks),
+            self._fall,
+        )
+
+        for dex, slot in enumerate(slots):
+            entity = paths[slot][0]
+            entity.elevation_velocity = float(elevation_velocities[dex])
+            if not self._active[slot]:
+                entity.velocity2 = (0, 0)
+                continue
+            entity.velocity2 = (
+                float(velocities[dex, 0]), float(velocities[dex, 1]),
+            )
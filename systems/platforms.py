@@ -0,0 +1,84 @@
+import math
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+from pygame.typing import Point
+
+from systems.tiles import TileGrid
+from systems.spatial import SpatialHash
+
+
+# Tiles whose elevation / height is animated from code (lifts)
+# Every move records how far the tile's top went this tick and carry()
+# moves whatever was standing on it by the same amount in the same pass
+# Riders are found through the spatial hash (cell_size 1 so cells are
+# tiles), only around tiles that actually moved
+class PlatformMover(object):
+    def __init__(self: Self,
+                 grid: TileGrid,
+                 spatial: SpatialHash,
+                 radius: Real=0.2,
+                 tolerance: Real=0.05) -> None:
+
+        self._grid = grid
+        self._spatial = spatial
+        self._radius = radius # rider half width
+        self._tolerance = tolerance # how far above the top still stands
+        self._displacements = {} # tile: [old top, displacement]
+
+    @property
+    def displacements(self: Self) -> dict:
+        return {tile: data[1] for tile, data in self._displacements.items()}
+
+    # top of a tile that can be stood on (None for empty / thin tiles)
+    def _top(self: Self, tile: tuple[int, int]) -> Optional[float]:
+        index = self._grid.index(tile)
+        if (index is None
+            or not self._grid.solid[index]
+            or self._grid.rows[index] >= 0):
+            return None
+        return float(self._grid.elevation[index] + self._grid.height[index])
+
+    # set_tile on walls plus the grid update, returns the top displacement
+    def move(self: Self, walls: object, pos: Point, **data) -> float:
+        tile = (math.floor(pos[0]), math.floor(pos[1]))
+        old = self._top(tile)
+        walls.set_tile(pos=tile, **data)
+        self._grid.update(tile)
+        new = self._top(tile)
+        if old is None or new is None or new == old:
+            return 0
+        if tile in self._displacements:
+            # moved twice this tick, keep the first old top
+            entry = self._displacements[tile]
+            entry[1] = new - entry[0]
+        else:
+            self._displacements[tile] = [old, new - old]
+        return new - old
+
+    def _riders(self: Self, tile: tuple[int, int]) -> list:
+        x, y = tile
+        radius = self._radius
+        return self._spatial.query_aabb(
+            (x - radius, y - radius, 1 + 2 * radius, 1 + 2 * radius),
+        )
+
+    # moves riders of every tile moved since the last carry
+    # a rider over several moving tiles goes with the highest one
+    # returns the riders that were carried
+    def carry(self: Self) -> list:
+        carried = {} # rider: (old top, displacement)
+        for tile, (old, displacement) in self._displacements.items():
+            for rider in self._riders(tile):
+                if abs(rider.elevation - old) > self._tolerance:
+                    continue
+                if rider in carried and carried[rider][0] >= old:
+                    continue
+                carried[rider] = (old, displacement)
+        self._displacements = {}
+        for rider, (old, displacement) in carried.items():
+            rider.elevation = old + displacement
+            if displacement > 0:
+                rider.elevation_velocity = max(rider.elevation_velocity, 0)
+        return list(carried)
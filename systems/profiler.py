@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+_SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+# Captures the next N frames of the game loop
+# 'sample' mode walks the main thread's stack from a background thread
+# every interval (so it costs about the same whatever the code does) and
+# 'cprofile' mode runs cProfile, which also sees Cython modules built with
+# profiling on (./build.sh --profile)
+# The loop calls frame() at the start of every frame and phase() when it
+# moves on to another part of the frame, every sample is tagged with both
+# When the capture ends a Chrome trace (chrome://tracing, Perfetto) and in
+# sample mode a speedscope profile are written to directory
+class Profiler(object):
+    def __init__(self: Self,
+                 directory: str='profiles',
+                 interval: Real=0.001) -> None:
+        self._directory = directory
+        self._interval = interval # seconds between samples
+        self._capturing = 0
+        self._mode = None
+        self._frames_left = 0
+        self._frame = 0
+        self._phase = None
+        self._paths = []
+        self._captures = 0
+
+    @property
+    def capturing(self: Self) -> bool:
+        return self._capturing
+
+    @property
+    def mode(self: Self) -> Optional[str]:
+        return self._mode
+
+    # files written by the last capture
+    @property
+    def paths(self: Self) -> list[str]:
+        return self._paths
+
+    def _now(self: Self) -> float:
+        # microseconds since the capture started
+        return (time.perf_counter() - self._start) * 1e6
+
+    def start(self: Self, frames: int=300, mode: str='sample') -> None:
+        if self._capturing:
+            return
+        if mode not in ('sample', 'cprofile'):
+            raise ValueError(f'unknown profiler mode {mode}')
+        self._mode = mode
+        self._frames_left = frames
+        self._frame = 0
+        self._phase = None
+        self._start = time.perf_counter()
+        self._events = [] # chrome trace events of frames and phases
+        self._frame_start = 0
+        self._phase_start = 0
+        self._capturing = 1
+        if mode == 'sample':
+            self._samples = [] # (time, stack, frame, phase)
+            self._codes = {} # code: frame index
+            self._thread_id = threading.get_ident()
+            # the sampler needs the GIL, let it take it every interval
+            self._switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self._interval, self._switch_interval))
+            self._stopping = threading.Event()
+            self._sampler = threading.Thread(target=self._sample, daemon=1)
+            self._sampler.start()
+        else:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def toggle(self: Self, frames: int=300, mode: str='sample') -> None:
+        if self._capturing:
+            self.stop()
+        else:
+            self.start(frames, mode)
+
+    def _sample(self: Self) -> None:
+        codes = self._codes
+        while not self._stopping.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                index = codes.get(code)
+                if index is None:
+                    index = codes[code] = len(codes)
+                stack.append(index)
+                frame = frame.f_back
+            stack.reverse()
+            self._samples.append(
+                (self._now(), tuple(stack), self._frame, self._phase),
+            )
+
+    def _end_phase(self: Self, now: float) -> None:
+        if self._phase is not None:
+            self._events.append({
+                'name': self._phase,
+                'cat': 'phase',
+                'ph': 'X',
+                'ts': self._phase_start,
+                'dur': now - self._phase_start,
+                'pid': 0,
+                'tid': 1,
+                'args': {'frame': self._frame},
+            })
+        self._phase = None
+
+    def phase(self: Self, name: str) -> None:
+        if not self._capturing:
+            return
+        now = self._now()
+        self._end_phase(now)
+        self._phase = name
+        self._phase_start = now
+
+    # ends the capture after the requested number of frames
+    def frame(self: Self) -> None:
+        if not self._capturing:
+            return
+        now = self._now()
+        self._end_phase(now)
+        if self._frame:
+            self._events.append({
+                'name': f'frame {self._frame}',
+                'cat': 'frame',
+                'ph': 'X',
+                'ts': self._frame_start,
+                'dur': now - self._frame_start,
+                'pid': 0,
+                'tid': 0,
+                'args': {'frame': self._frame},
+            })
+        if self._frames_left <= 0:
+            self.stop()
+            return
+        self._frames_left -= 1
+        self._frame += 1
+        self._frame_start = now
+
+    def stop(self: Self) -> list[str]:
+        if not self._capturing:
+            return self._paths
+        self._capturing = 0
+        self._end_phase(self._now())
+        os.makedirs(self._directory, exist_ok=1)
+        self._captures += 1
+        base = os.path.join(
+            self._directory,
+            time.strftime('profile-%Y%m%d-%H%M%S') + f'-{self._captures}',
+        )
+        metadata = [
+            {
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': 0,
+                'tid': tid,
+                'args': {'name': name},
+            }
+            for tid, name in ((0, 'frames'), (1, 'phases'), (2, 'samples'))
+        ]
+        self._paths = []
+        if self._mode == 'sample':
+            self._stopping.set()
+            self._sampler.join()
+            sys.setswitchinterval(self._switch_interval)
+            frames = [None] * len(self._codes)
+            for code, index in self._codes.items():
+                frames[index] = {
+                    'name': code.co_name,
+                    'file': code.co_filename,
+                    'line': code.co_firstlineno,
+                }
+            events = metadata + self._events + self._sample_events(frames)
+            self._paths.append(self._write(f'{base}.speedscope.json', {
+                '$schema': _SPEEDSCOPE_SCHEMA,
+                'exporter': 'computergenesis',
+                'name': os.path.basename(base),
+                'shared': {'frames': frames},
+                'profiles': self._speedscope_profiles(),
+            }))
+            self._samples = []
+        else:
+            self._cprofile.disable()
+            stats = pstats.Stats(self._cprofile)
+            stats.dump_stats(f'{base}.prof')
+            self._paths.append(f'{base}.prof')
+            events = metadata + self._events
+            self._cprofile = None
+        self._paths.append(
+            self._write(f'{base}.trace.json', {
+                'traceEvents': events,
+                'displayTimeUnit': 'ms',
+            }),
+        )
+        self._events = []
+        return self._paths
+
+    def _write(self: Self, path: str, data: dict) -> str:
+        with open(path, 'w') as file:
+            json.dump(data, file)
+        return path
+
+    # samples turned into nested complete events, a function's event
+    # lasts for as long as consecutive samples have it at the same depth
+    def _sample_events(self: Self, frames: list[dict]) -> list[dict]:
+        events = []
+        opened = [] # [frame index, start]
+        def close(depth: int, now: float) -> None:
+            while len(opened) > depth:
+                index, start = opened.pop()
+                events.append({
+                    'name': frames[index]['name'],
+                    'cat': 'sample',
+                    'ph': 'X',
+                    'ts': start,
+                    'dur': now - start,
+                    'pid': 0,
+                    'tid': 2,
+                    'args': {
+                        'file': frames[index]['file'],
+                        'line': frames[index]['line'],
+                    },
+                })
+        for now, stack, frame, phase in self._samples:
+            depth = 0
+            while (depth < len(opened)
+                   and depth < len(stack)
+                   and opened[depth][0] == stack[depth]):
+                depth += 1
+            close(depth, now)
+            for index in stack[depth:]:
+                opened.append([index, now])
+        if self._samples:
+            close(0, self._samples[-1][0] + self._interval * 1e6)
+        return events
+
+    # one speedscope profile per phase plus the whole capture, weights are
+    # the time to the next sample
+    def _speedscope_profiles(self: Self) -> list[dict]:
+        samples = self._samples
+        weights = [
+            (following[0] - sample[0]) / 1000
+            for sample, following in zip(samples, samples[1:])
+        ]
+        if samples:
+            weights.append(self._interval * 1000)
+        groups = {'all': ([], [])}
+        for (now, stack, frame, phase), weight in zip(samples, weights):
+            for name in ('all', phase or 'untagged'):
+                group = groups.setdefault(name, ([], []))
+                group[0].append(list(stack))
+                group[1].append(weight)
+        return [
+            {
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(group[1]),
+                'samples': group[0],
+                'weights': group[1],
+            }
+            for name, group in groups.items()
+        ]
@@ -0,0 +1,286 @@
+import math
+from numbers import Real
+from typing import Self
+from typing import Iterable
+from typing import Optional
+
+import numpy as np
+from pygame.typing import Point
+
+from systems.tiles import TileGrid
+from systems.spatial import SpatialHash
+from systems.raycast import cast_rays
+
+
+# Fixed capacity pool of projectiles (rockets, enemy shots)
+# State lives in arrays and dead slots go back on a free stack so firing
+# never allocates, when the pool is full the oldest projectile is reused
+# Every tick all projectiles sweep their step through the tile grid at
+# once and only the ones near entities (spatial hash) test entities
+class ProjectilePool(object):
+    def __init__(self: Self,
+                 capacity: int=256,
+                 radius: Real=0.1,
+                 lifetime: Real=300) -> None:
+
+        self._capacity = capacity
+        self._radius = radius
+        self._lifetime = lifetime
+        self._pos = np.zeros((capacity, 2))
+        self._velocity = np.zeros((capacity, 2))
+        self._elevation = np.zeros(capacity)
+        self._elevation_velocity = np.zeros(capacity)
+        self._gravity = np.zeros(capacity)
+        self._age = np.zeros(capacity)
+        self._alive = np.zeros(capacity, dtype=np.bool_)
+        self._owners = [None] * capacity
+        self._data = [None] * capacity # whatever the shooter attached
+        self._free = np.arange(capacity - 1, -1, -1, dtype=np.intp)
+        self._free_count = capacity
+        # grid sized broadphase maps, reallocated only when the grid grows
+        self._near = None
+        self._scratch = None
+
+    @property
+    def capacity(self: Self) -> int:
+        return self._capacity
+
+    @property
+    def count(self: Self) -> int:
+        return self._capacity - self._free_count
+
+    @property
+    def radius(self: Self) -> Real:
+        return self._radius
+
+    @property
+    def pos(self: Self) -> np.ndarray:
+        return self._pos
+
+    @property
+    def elevation(self: Self) -> np.ndarray:
+        return self._elevation
+
+    @property
+    def alive(self: Self) -> np.ndarray:
+        return self._alive
+
+    def owner(self: Self, index: int) -> object:
+        return self._owners[index]
+
+    def data(self: Self, index: int) -> object:
+        return self._data[index]
+
+    # velocities are per tick, yaw in degrees like entities
+    def spawn(self: Self,
+              pos: Point,
+              elevation: Real,
+              yaw: Real,
+              speed: Real,
+              elevation_velocity: Real=0,
+              gravity: Real=0,
+              owner: Optional[object]=None,
+              data: Optional[object]=None) -> int:
+
+        if self._free_count:
+            self._free_count -= 1
+            index = int(self._free[self._free_count])
+        else:
+            index = int(np.argmax(self._age))
+        radians = math.radians(yaw)
+        self._pos[index] = pos[0], pos[1]
+        self._velocity[index] = (
+            math.cos(radians) * speed, math.sin(radians) * speed,
+        )
+        self._elevation[index] = elevation
+        self._elevation_velocity[index] = elevation_velocity
+        self._gravity[index] = gravity
+        self._age[index] = 0
+        self._alive[index] = 1
+        self._owners[index] = owner
+        self._data[index] = data
+        return index
+
+    def kill(self: Self, index: int) -> None:
+        if not self._alive[index]:
+            return
+        self._alive[index] = 0
+        self._owners[index] = None
+        self._data[index] = None
+        self._free[self._free_count] = index
+        self._free_count += 1
+
+    def clear(self: Self) -> None:
+        for index in np.flatnonzero(self._alive):
+            self.kill(index)
+
+    # first entity crossed by the step of projectile index before limit
+    # (a fraction of the step) as (fraction, entity) or None
+    def _hit_entity(self: Self,
+                    index: int,
+                    delta: np.ndarray,
+                    dz: float,
+                    limit: float,
+                    spatial: SpatialHash,
+                    kind: Optional[type | tuple],
+                    tags: Optional[Iterable[str]],
+                    entity_radius: Real) -> Optional[tuple]:
+
+        x, y = self._pos[index]
+        dx, dy = delta
+        length = math.hypot(dx, dy)
+        reach = self._radius + entity_radius
+        candidates = spatial.query_radius(
+            (x + dx / 2, y + dy / 2),
+            length / 2 + reach,
+            kind,
+            tags,
+            self._owners[index],
+        )
+        squared = length * length
+        best = None
+        for obj in candidates:
+            ox, oy = spatial.pos(obj)
+            fraction = 0
+            if squared:
+                fraction = min(
+                    max(((ox - x) * dx + (oy - y) * dy) / squared, 0), 1,
+                )
+            if fraction > limit or best is not None and fraction >= best[0]:
+                continue
+            cx = x + dx * fraction - ox
+            cy = y + dy * fraction - oy
+            if cx * cx + cy * cy > reach * reach:
+                continue
+            z = self._elevation[index] + dz * fraction
+            elevation = getattr(obj, 'elevation', 0)
+            height = getattr(obj, 'height', 1)
+            if elevation - self._radius <= z <= elevation + height:
+                best = (fraction, obj)
+        return best
+
+    # broadphase: which of the active projectiles have an entity within
+    # reach of their step, done on a grid sized occupancy map so that only
+    # those go through the spatial hash
+    def _near_entities(self: Self,
+                       grid: TileGrid,
+                       spatial: SpatialHash,
+                       active: np.ndarray,
+                       deltas: np.ndarray,
+                       entity_radius: Real) -> np.ndarray:
+
+        if self._near is None or self._near.shape != grid.shape:
+            self._near = np.zeros(grid.shape, dtype=np.bool_)
+            self._scratch = np.zeros(grid.shape, dtype=np.bool_)
+        near = self._near
+        scratch = self._scratch
+        positions = np.array([spatial.pos(obj) for obj in spatial.objects])
+        near.fill(0)
+        near[grid.indices(positions[:, 0], positions[:, 1])] = 1
+        reach = math.ceil(
+            np.abs(deltas).max() / 2 + self._radius + entity_radius,
+        )
+        # dilate so that a lookup at the middle of a step finds every
+        # entity within reach (clipping onto the edges keeps it
+        # conservative outside the grid)
+        for _ in range(reach):
+            np.copyto(scratch, near)
+            near[1:] |= scratch[:-1]
+            near[:-1] |= scratch[1:]
+            np.copyto(scratch, near)
+            near[:, 1:] |= scratch[:, :-1]
+            near[:, :-1] |= scratch[:, 1:]
+        middles = self._pos[active] + deltas / 2
+        return np.flatnonzero(
+            near[grid.indices(middles[:, 0], middles[:, 1])],
+        )
+
+    # moves every projectile, returns the impacts of this tick as
+    # (pos, elevation, entity or None for tiles / floor, owner, data)
+    # hit projectiles are killed
+    def step(self: Self,
+             rel_game_speed: Real,
+             grid: TileGrid,
+             spatial: Optional[SpatialHash]=None,
+             kind: Optional[type | tuple]=None,
+             tags: Optional[Iterable[str]]=None,
+             entity_radius: Real=0.2) -> list[tuple]:
+
+        active = np.flatnonzero(self._alive)
+        if not active.size:
+            return []
+        self._age[active] += rel_game_speed
+        self._elevation_velocity[active] -= (
+            self._gravity[active] * rel_game_speed
+        )
+        deltas = self._velocity[active] * rel_game_speed
+        dz = self._elevation_velocity[active] * rel_game_speed
+        z = self._elevation[active]
+
+        # tiles (t is a fraction of the step)
+        hit, fractions, cells, sides = cast_rays(
+            grid, self._pos[active], deltas, 1, z=z, dz=dz,
+        )
+        # floor, the tile under the start and under the end of the step
+        # (a landing only counts if it is still over that tile)
+        floor = np.full(active.size, np.inf)
+        falling = np.flatnonzero(dz < 0)
+        if falling.size:
+            starts = self._pos[active[falling]]
+            moves = deltas[falling]
+            heights = z[falling]
+            drops = dz[falling]
+            landings = floor[falling]
+            for points in (starts, starts + moves):
+                levels = grid.floors(points[:, 0], points[:, 1], heights)
+                landing = (levels - heights) / drops
+                landed = starts + moves * landing[:, None]
+                over = (np.floor(landed) == np.floor(points)).all(axis=1)
+                landings = np.where(
+                    over & (landing < landings), landing, landings,
+                )
+            floor[falling] = landings
+        grounded = floor < fractions
+        fractions = np.where(grounded, floor, fractions)
+        hit |= grounded
+
+        targets = [None] * active.size
+        if spatial is not None and len(spatial):
+            for dex in self._near_entities(
+                grid, spatial, active, deltas, entity_radius,
+            ):
+                found = self._hit_entity(
+                    active[dex],
+                    deltas[dex],
+                    dz[dex],
+                    fractions[dex] if hit[dex] else 1,
+                    spatial,
+                    kind,
+                    tags,
+                    entity_radius,
+                )
+                if found is not None:
+                    fractions[dex], targets[dex] = found
+                    hit[dex] = 1
+
+        # hits stop where they hit, misses move the whole step
+        fractions = np.where(hit, fractions, 1)
+        self._pos[active] += deltas * fractions[:, None]
+        self._elevation[active] += dz * fractions
+
+        impacts = []
+        for dex in np.flatnonzero(hit):
+            index = int(active[dex])
+            impacts.append((
+                (float(self._pos[index, 0]), float(self._pos[index, 1])),
+                float(self._elevation[index]),
+                targets[dex],
+                self._owners[index],
+                self._data[index],
+            ))
+        expired = active[~hit & (self._age[active] >= self._lifetime)]
+        for index in active[hit]:
+            self.kill(index)
+        for index in expired:
+            self.kill(index)
+        return impacts
@@ -0,0 +1,149 @@
+import math
+from numbers import Real
+from typing import Optional
+
+import numpy as np
+
+from pygame.typing import Point
+
+from systems.tiles import TileGrid
+
+
+# camera plane offset of every column
+def gen_plane(width: int, fov: Real) -> np.ndarray:
+    return (
+        ((np.arange(width, dtype=np.float32) + 0.5) / width * 2 - 1)
+        * np.float32(math.tan(math.radians(fov) / 2))
+    )
+
+
+# (width, 2) direction of every column (not normalized)
+def gen_column_dirs(forward: Point, plane: np.ndarray) -> np.ndarray:
+    dirs = np.empty((len(plane), 2), dtype=np.float64)
+    dirs[:, 0] = forward[0] - forward[1] * plane
+    dirs[:, 1] = forward[1] + forward[0] * plane
+    return dirs
+
+
+# Vectorized DDA: every ray steps one cell per iteration together
+# A cell blocks a ray if its [elevation, elevation + height] overlaps the
+# z range of the ray inside the cell (z = z + dz * t)
+# If z is None every solid tile with a height blocks
+# Tiles with a rect / semitile only block where the ray crosses one of
+# their precomputed segments (TileGrid.geometry)
+# Distances are in units of the direction vectors, so unnormalized camera
+# plane directions give perpendicular distances
+# returns (hit, distances, tiles, sides); side 0 is an x side, 1 a y side
+def cast_rays(grid: TileGrid,
+              origins: np.ndarray,
+              dirs: np.ndarray,
+              max_distance: Real,
+              z: Optional[np.ndarray]=None,
+              dz: Optional[np.ndarray]=None) -> tuple:
+
+    dirs = np.asarray(dirs, dtype=np.float64).reshape(-1, 2)
+    count = len(dirs)
+    origins = np.broadcast_to(
+        np.asarray(origins, dtype=np.float64), (count, 2),
+    )
+    if z is not None:
+        z = np.broadcast_to(np.asarray(z, dtype=np.float64), (count, ))
+        if dz is None:
+            dz = np.zeros(count)
+        dz = np.broadcast_to(np.asarray(dz, dtype=np.float64), (count, ))
+
+    cells = np.floor(origins).astype(np.intp)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deltas = np.abs(1 / dirs)
+        steps = np.where(dirs < 0, -1, 1)
+        sides = np.where(
+            dirs < 0, origins - cells, cells + 1 - origins,
+        ) * deltas
+    sides[~np.isfinite(sides)] = np.inf
+
+    hit = np.zeros(count, dtype=np.bool_)
+    distances = np.full(count, float(max_distance))
+    side = np.zeros(count, dtype=np.int8)
+    solid = grid.solid
+    elevation = grid.elevation
+    top = grid.elevation + grid.height
+    rows = grid.rows
+    geometry = grid.geometry
+    shape = solid.shape
+    origin = grid.origin
+
+    # which of the active rays are stopped by the cell they are in
+    # entered and left are the ray's t range inside the cell
+    def test(active: np.ndarray,
+             entered: np.ndarray,
+             left: np.ndarray) -> np.ndarray:
+
+        gx = cells[active, 0] - origin[0]
+        gy = cells[active, 1] - origin[1]
+        inside = (gx >= 0) & (gx < shape[0]) & (gy >= 0) & (gy < shape[1])
+        # ufuncs directly, np.clip's wrapper costs more than the clipping
+        np.minimum(np.maximum(gx, 0, out=gx), shape[0] - 1, out=gx)
+        np.minimum(np.maximum(gy, 0, out=gy), shape[1] - 1, out=gy)
+        blocked = inside & solid[gx, gy]
+        if z is None:
+            blocked &= top[gx, gy] > elevation[gx, gy]
+        else:
+            z_in = z[active] + dz[active] * entered
+            z_out = z[active] + dz[active] * left
+            low = np.minimum(z_in, z_out)
+            high = np.maximum(z_in, z_out)
+            blocked &= (low <= top[gx, gy]) & (high >= elevation[gx, gy])
+        found = entered.copy()
+
+        # thin tiles need the ray to actually cross a segment
+        thin = np.flatnonzero(blocked & (rows[gx, gy] >= 0))
+        if thin.size:
+            rays = active[thin]
+            crossed, crossings, normals = geometry.intersect(
+                rows[gx[thin], gy[thin]],
+                origins[rays],
+                dirs[rays],
+                entered[thin],
+                left[thin],
+            )
+            blocked[thin] = crossed
+            found[thin] = crossings
+            side[rays[crossed]] = np.abs(normals[crossed, 1]) > 0.5
+
+        hits = active[blocked]
+        hit[hits] = 1
+        distances[hits] = found[blocked]
+        return blocked
+
+    # the starting cell only matters for thin tiles
+    active = np.arange(count)
+    start_rows = rows[
+        np.clip(cells[:, 0] - origin[0], 0, shape[0] - 1),
+        np.clip(cells[:, 1] - origin[1], 0, shape[1] - 1),
+    ]
+    starting = np.flatnonzero(start_rows >= 0)
+    if starting.size:
+        left = np.minimum(sides[starting].min(axis=1), max_distance)
+        blocked = test(starting, np.zeros(starting.size), left)
+        active = np.setdiff1d(active, starting[blocked])
+
+    # most cells a ray can cross before max_distance
+    lengths = np.abs(dirs).sum(axis=1)
+    iterations = math.ceil(max_distance * lengths.max(initial=0)) + 1
+    for _ in range(iterations):
+        if not active.size:
+            break
+        side_x = sides[active, 0]
+        side_y = sides[active, 1]
+        axis = (side_y < side_x).astype(np.intp) # 0 is x, 1 is y
+        entered = np.minimum(side_x, side_y)
+        cells[active, axis] += steps[active, axis]
+        sides[active, axis] += deltas[active, axis]
+        side[active] = axis
+
+        near = entered <= max_distance
+        active = active[near]
+        left = np.minimum(sides[active].min(axis=1), max_distance)
+        active = active[~test(active, entered[near], left)]
+
+    return (hit, distances, cells, side)
@@ -0,0 +1,131 @@
+import os
+import copy
+import json
+import zlib
+import queue
+import threading
+from typing import Self
+from typing import Optional
+
+from systems.tiles import TileGrid
+from systems.tiles import parse_tile_key
+
+# bumped whenever the snapshot layout changes
+SAVE_VERSION = 1
+
+
+# json has no tuples, tile data uses them for colors and positions
+def _tuples(value: object) -> object:
+    if isinstance(value, dict):
+        return {key: _tuples(item) for key, item in value.items()}
+    if isinstance(value, list | tuple):
+        return tuple(_tuples(item) for item in value)
+    return value
+
+
+# Tiles that differ from the pristine tilemap, only looking at the tiles
+# the grid saw change (tile edits must call grid.update)
+# returns {'set': {key: data}, 'removed': [key]}
+def tilemap_delta(pristine: dict, grid: TileGrid) -> dict:
+    tilemap = grid.tilemap
+    delta = {'set': {}, 'removed': []}
+    for key in grid.changed:
+        data = tilemap.get(key)
+        if data is None:
+            if key in pristine:
+                delta['removed'].append(key)
+        elif data != pristine.get(key):
+            delta['set'][key] = copy.deepcopy(data)
+    return delta
+
+
+# Brings the walls to pristine + delta, only touching tiles in the delta or
+# changed since the level was loaded
+# Tiles are set through walls.set_tile and removed through grid.remove,
+# the grid is updated for both
+# walls needs set_tile(pos=..., **data) and tilemap
+def apply_delta(pristine: dict,
+                delta: dict,
+                walls: object,
+                grid: TileGrid) -> None:
+    tilemap = walls.tilemap
+    removed = set(delta['removed'])
+    for key in set(grid.changed) | set(delta['set']) | removed:
+        if key in removed:
+            data = None
+        else:
+            data = delta['set'].get(key, pristine.get(key))
+        if tilemap.get(key) == data:
+            continue
+        pos = parse_tile_key(key)
+        if data is None:
+            grid.remove(pos)
+        else:
+            walls.set_tile(pos=pos, **copy.deepcopy(data))
+            grid.update(pos)
+
+
+# Compresses and writes snapshots on a background thread
+# save() only queues the snapshot (which must not be touched afterwards),
+# files are written to a temporary file first and then swapped in so a
+# crash never leaves half a save
+class SaveWriter(object):
+    def __init__(self: Self, level: int=6) -> None:
+        self._level = level # zlib level
+        self._queue = queue.Queue()
+        self._errors = []
+        self._thread = threading.Thread(target=self._run, daemon=1)
+        self._thread.start()
+
+    # exceptions raised while writing (the game loop decides what to show)
+    @property
+    def errors(self: Self) -> list:
+        return self._errors
+
+    @property
+    def pending(self: Self) -> int:
+        return self._queue.unfinished_tasks
+
+    def save(self: Self, path: str, snapshot: dict) -> None:
+        self._queue.put((path, snapshot))
+
+    def _run(self: Self) -> None:
+        while 1:
+            path, snapshot = self._queue.get()
+            try:
+                if path is None:
+                    return
+                data = zlib.compress(
+                    json.dumps(snapshot, separators=(',', ':')).encode(),
+                    self._level,
+                )
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=1)
+                with open(f'{path}.tmp', 'wb') as file:
+                    file.write(data)
+                os.replace(f'{path}.tmp', path)
+            except Exception as error:
+                self._errors.append(error)
+            finally:
+                self._queue.task_done()
+
+    # waits for queued saves
+    def flush(self: Self) -> None:
+        self._queue.join()
+
+    def close(self: Self) -> None:
+        self._queue.put((None, None))
+        self._thread.join()
+
+
+def load_snapshot(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        snapshot = json.loads(zlib.decompress(file.read()))
+    if snapshot.get('version') != SAVE_VERSION:
+        return None
+    tiles = snapshot['tiles']
+    tiles['set'] = {key: _tuples(data) for key, data in tiles['set'].items()}
+    return snapshot
@@ -0,0 +1,116 @@
+import time
+from collections import deque
+from numbers import Real
+from typing import Self
+from typing import Optional
+from typing import Generator
+
+
+# Cooperative scheduler for AI work
+# Tasks are generators that yield whenever they can be paused, every frame
+# run() resumes them round robin (each at most once per frame) until the
+# budget is spent and the next frame carries on from where it stopped
+# A task that runs past the budget isn't interrupted, so tasks should yield
+# between expensive steps
+class Scheduler(object):
+    def __init__(self: Self, budget: Real=2) -> None:
+        self._budget = budget # ms per frame
+        self._tasks = deque() # task ids in run order
+        # id: [generator, name, stats]
+        self._data = {}
+        self._next_id = 0
+        self._last = {'ms': 0, 'ran': 0, 'waiting': 0}
+
+    @property
+    def budget(self: Self) -> Real:
+        return self._budget
+
+    @budget.setter
+    def budget(self: Self, value: Real) -> None:
+        self._budget = value
+
+    # ms spent, tasks resumed and tasks left waiting in the last run
+    @property
+    def last(self: Self) -> dict:
+        return self._last
+
+    def __len__(self: Self) -> int:
+        return len(self._data)
+
+    def __contains__(self: Self, task_id: int) -> bool:
+        return task_id in self._data
+
+    def spawn(self: Self,
+              task: Generator,
+              name: Optional[str]=None) -> int:
+        task_id = self._next_id
+        self._next_id += 1
+        self._data[task_id] = [
+            task,
+            name or getattr(task, '__name__', str(task_id)),
+            {'calls': 0, 'total': 0, 'max': 0, 'last': 0},
+        ]
+        self._tasks.append(task_id)
+        return task_id
+
+    def cancel(self: Self, task_id: int) -> None:
+        data = self._data.pop(task_id, None)
+        if data is not None:
+            data[0].close()
+
+    def clear(self: Self) -> None:
+        for task_id in list(self._data):
+            self.cancel(task_id)
+        self._tasks.clear()
+
+    # {id: {name, calls, total ms, max ms, last ms, mean ms}} of live tasks
+    def stats(self: Self) -> dict:
+        stats = {}
+        for task_id, (task, name, task_stats) in self._data.items():
+            stats[task_id] = dict(task_stats, name=name)
+            stats[task_id]['mean'] = (
+                task_stats['total'] / task_stats['calls']
+                if task_stats['calls'] else 0
+            )
+        return stats
+
+    def run(self: Self) -> None:
+        start = time.perf_counter()
+        deadline = start + self._budget / 1000
+        ran = 0
+        waiting = len(self._tasks)
+        for _ in range(len(self._tasks)):
+            if ran and time.perf_counter() >= deadline:
+                break
+            waiting -= 1
+            task_id = self._tasks.popleft()
+            data = self._data.get(task_id)
+            if data is None: # cancelled
+                continue
+            task_start = time.perf_counter()
+            try:
+                next(data[0])
+                finished = 0
+            except StopIteration:
+                finished = 1
+            cost = (time.perf_counter() - task_start) * 1000
+            ran += 1
+            stats = data[2]
+            stats['calls'] += 1
+            stats['total'] += cost
+            stats['last'] = cost
+            stats['max'] = max(stats['max'], cost)
+            if finished:
+                del self._data[task_id]
+            else:
+                self._tasks.append(task_id)
+        # drop ids of tasks cancelled while waiting
+        if len(self._tasks) != len(self._data):
+            self._tasks = deque(
+                task_id for task_id in self._tasks if task_id in self._data
+            )
+        self._last = {
+            'ms': (time.perf_counter() - start) * 1000,
+            'ran': ran,
+            'waiting': waiting,
+        }
@@ -0,0 +1,164 @@
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+import pygame as pg
+
+from systems.cache import SurfaceCache
+
+
+# Distance shading is quantized into bands so that every shaded value can be
+# looked up instead of multiplied every frame.
+# factor = 1 - darkness * distance / render_distance (clamped to [0, 1])
+class ShadeTable(object):
+    def __init__(self: Self,
+                 render_distance: Real,
+                 bands: int=32,
+                 max_bytes: int=16 * 2 ** 20) -> None:
+
+        self._render_distance = render_distance
+        self._bands = bands
+        self._band_size = render_distance / bands
+        # darkness: (bands, 256) uint8
+        self._luts = {}
+        # darkness: (bands, ) uint16 8.8 fixed point factors
+        self._scales = {}
+        # (surf, darkness, band): shaded surf
+        self._surfs = SurfaceCache(max_bytes)
+
+    @property
+    def render_distance(self: Self) -> Real:
+        return self._render_distance
+
+    @property
+    def bands(self: Self) -> int:
+        return self._bands
+
+    @property
+    def max_bytes(self: Self) -> int:
+        return self._surfs.max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self: Self, value: int) -> None:
+        self._surfs.max_bytes = value
+
+    @property
+    def bytes(self: Self) -> int:
+        # luts are tiny compared to surfs but count them anyway
+        return (
+            self._surfs.bytes
+            + sum(lut.nbytes for lut in self._luts.values())
+            + sum(scales.nbytes for scales in self._scales.values())
+        )
+
+    def clear(self: Self) -> None:
+        self._luts = {}
+        self._scales = {}
+        self._surfs.clear()
+
+    def band(self: Self, distance: Real) -> int:
+        return min(max(int(distance / self._band_size), 0), self._bands - 1)
+
+    def band_array(self: Self, distances: np.ndarray) -> np.ndarray:
+        return np.clip(
+            (distances / self._band_size).astype(np.intp), 0, self._bands - 1,
+        )
+
+    def factors(self: Self, darkness: Real) -> np.ndarray:
+        # middle of each band
+        distances = (np.arange(self._bands) + 0.5) * self._band_size
+        return np.clip(
+            1 - darkness * distances / self._render_distance, 0, 1,
+        )
+
+    # factors of per value darkness at per value bands (broadcast together)
+    def factors_at(self: Self,
+                   darkness: np.ndarray,
+                   bands: np.ndarray) -> np.ndarray:
+        distances = (bands + 0.5) * self._band_size
+        return np.clip(
+            1 - darkness * distances / self._render_distance, 0, 1,
+        )
+
+    def factor(self: Self, darkness: Real, distance: Real) -> float:
+        return float(self.factors(darkness)[self.band(distance)])
+
+    def lut(self: Self, darkness: Real) -> np.ndarray:
+        darkness = round(darkness, 2) # keeps the number of luts bounded
+        lut = self._luts.get(darkness)
+        if lut is None:
+            lut = (
+                self.factors(darkness)[:, None]
+                * np.arange(256, dtype=np.float32)[None, :]
+            ).astype(np.uint8)
+            self._luts[darkness] = lut
+        return lut
+
+    def scales(self: Self, darkness: Real) -> np.ndarray:
+        darkness = round(darkness, 2)
+        scales = self._scales.get(darkness)
+        if scales is None:
+            scales = np.round(self.factors(darkness) * 256).astype(np.uint16)
+            self._scales[darkness] = scales
+        return scales
+
+    def shade(self: Self,
+              colors: np.ndarray,
+              darkness: Real | np.ndarray,
+              distances: np.ndarray,
+              out: Optional[np.ndarray]=None) -> np.ndarray:
+        # colors: (..., 3) uint8, distances and darkness: (...) or darkness
+        # a scalar
+        # the factor of every value is looked up by band and applied as an
+        # integer multiply, gathering every value through the (bands, 256)
+        # lut is slower than multiplying once the arrays are big
+        bands = self.band_array(distances)
+        if np.ndim(darkness):
+            scales = np.round(
+                self.factors_at(darkness, bands) * 256,
+            ).astype(np.uint16)
+        else:
+            scales = self.scales(darkness)[bands]
+        if out is None:
+            out = np.empty(colors.shape, dtype=np.uint8)
+        np.right_shift(
+            colors * scales[..., None], 8, out=out, casting='unsafe',
+        )
+        return out
+
+    def shade_color(self: Self,
+                    color: tuple,
+                    darkness: Real,
+                    distance: Real) -> tuple:
+        row = self.lut(darkness)[self.band(distance)]
+        return (int(row[color[0]]), int(row[color[1]]), int(row[color[2]]))
+
+    def texture(self: Self,
+                surf: pg.Surface,
+                darkness: Real,
+                distance: Real) -> pg.Surface:
+        darkness = round(darkness, 2)
+        band = self.band(distance)
+        key = (surf, darkness, band)
+        shaded = self._surfs.get(key)
+        if shaded is None:
+            shaded = self.darken(surf, self.factors(darkness)[band])
+            self._surfs.set(key, shaded)
+        return shaded
+
+    @staticmethod
+    def darken(surf: pg.Surface, factor: Real) -> pg.Surface:
+        value = int(factor * 255)
+        shaded = surf.copy()
+        shaded.fill((value, value, value), special_flags=pg.BLEND_RGB_MULT)
+        return shaded
+
+    def prebake(self: Self, surfs: list[pg.Surface], darkness: Real) -> None:
+        # builds every band up front (stops early if memory cap is hit)
+        for surf in surfs:
+            for band in range(self._bands):
+                size = SurfaceCache.surf_bytes(surf)
+                if self._surfs.bytes + size > self._surfs.max_bytes:
+                    return
+                self.texture(surf, darkness, (band + 0.5) * self._band_size)
@@ -0,0 +1,183 @@
+import math
+from numbers import Real
+from typing import Self
+from typing import Iterable
+from typing import Optional
+
+from pygame.typing import Point
+
+
+# Uniform grid of objects keyed by tile (cell_size 1)
+# Objects only change buckets when they cross into another cell
+# Queries can be filtered by kind (isinstance) and tags (any of)
+class SpatialHash(object):
+    def __init__(self: Self, cell_size: Real=1) -> None:
+        self._cell_size = cell_size
+        self._cells = {} # cell: {obj: None} (dicts keep insertion order)
+        self._entries = {} # obj: [cell, (x, y), tags]
+
+    @property
+    def cell_size(self: Self) -> Real:
+        return self._cell_size
+
+    @property
+    def objects(self: Self) -> list:
+        return list(self._entries)
+
+    def __len__(self: Self) -> int:
+        return len(self._entries)
+
+    def __contains__(self: Self, obj: object) -> bool:
+        return obj in self._entries
+
+    def gen_cell(self: Self, pos: Point) -> tuple[int, int]:
+        return (
+            math.floor(pos[0] / self._cell_size),
+            math.floor(pos[1] / self._cell_size),
+        )
+
+    def cell(self: Self, cell: tuple[int, int]) -> list:
+        return list(self._cells.get(cell, ()))
+
+    def pos(self: Self, obj: object) -> tuple:
+        return self._entries[obj][1]
+
+    def tags(self: Self, obj: object) -> frozenset:
+        return self._entries[obj][2]
+
+    def insert(self: Self,
+               obj: object,
+               pos: Point,
+               tags: Iterable[str]=()) -> None:
+        if obj in self._entries:
+            self.remove(obj)
+        cell = self.gen_cell(pos)
+        self._entries[obj] = [cell, (pos[0], pos[1]), frozenset(tags)]
+        self._cells.setdefault(cell, {})[obj] = None
+
+    def remove(self: Self, obj: object) -> None:
+        entry = self._entries.pop(obj, None)
+        if entry is None:
+            return
+        bucket = self._cells[entry[0]]
+        del bucket[obj]
+        if not bucket:
+            del self._cells[entry[0]]
+
+    def move(self: Self, obj: object, pos: Point) -> None:
+        entry = self._entries[obj]
+        entry[1] = (pos[0], pos[1])
+        cell = self.gen_cell(pos)
+        if cell == entry[0]:
+            return
+        bucket = self._cells[entry[0]]
+        del bucket[obj]
+        if not bucket:
+            del self._cells[entry[0]]
+        entry[0] = cell
+        self._cells.setdefault(cell, {})[obj] = None
+
+    # re-reads .pos of every object
+    def sync(self: Self) -> None:
+        for obj in self._entries:
+            self.move(obj, obj.pos)
+
+    def clear(self: Self) -> None:
+        self._cells = {}
+        self._entries = {}
+
+    def _candidates(self: Self,
+                    left: Real,
+                    top: Real,
+                    right: Real,
+                    bottom: Real) -> Iterable:
+        x0, y0 = self.gen_cell((left, top))
+        x1, y1 = self.gen_cell((right, bottom))
+        cells = self._cells
+        # few objects spread over a big area: scan objects instead of cells
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+            for cell, bucket in cells.items():
+                if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1:
+                    yield from bucket
+            return
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bucket = cells.get((x, y))
+                if bucket:
+                    yield from bucket
+
+    def _accepts(self: Self,
+                 obj: object,
+                 kind: Optional[type | tuple],
+                 tags: Optional[Iterable[str]]) -> bool:
+        if kind is not None and not isinstance(obj, kind):
+            return 0
+        if tags is not None and self._entries[obj][2].isdisjoint(tags):
+            return 0
+        return 1
+
+    def query_aabb(self: Self,
+                   rect: tuple,
+                   kind: Optional[type | tuple]=None,
+                   tags: Optional[Iterable[str]]=None) -> list:
+        left, top = rect[0], rect[1]
+        right, bottom = rect[0] + rect[2], rect[1] + rect[3]
+        found = []
+        for obj in self._candidates(left, top, right, bottom):
+            x, y = self._entries[obj][1]
+            if (left <= x <= right
+                and top <= y <= bottom
+                and self._accepts(obj, kind, tags)):
+                found.append(obj)
+        return found
+
+    # sorted nearest first
+    def query_radius(self: Self,
+                     pos: Point,
+                     radius: Real,
+                     kind: Optional[type | tuple]=None,
+                     tags: Optional[Iterable[str]]=None,
+                     exclude: Optional[object]=None) -> list:
+        squared = radius * radius
+        found = []
+        for obj in self._candidates(
+            pos[0] - radius, pos[1] - radius, pos[0] + radius, pos[1] + radius,
+        ):
+            if obj is exclude:
+                continue
+            x, y = self._entries[obj][1]
+            distance = (x - pos[0]) ** 2 + (y - pos[1]) ** 2
+            if distance <= squared and self._accepts(obj, kind, tags):
+                found.append((distance, obj))
+        found.sort(key=lambda item: item[0])
+        return [obj for distance, obj in found]
+
+    # angle is the full cone width in degrees around forward
+    def query_cone(self: Self,
+                   pos: Point,
+                   forward: Point,
+                   radius: Real,
+                   angle: Real,
+                   kind: Optional[type | tuple]=None,
+                   tags: Optional[Iterable[str]]=None,
+                   exclude: Optional[object]=None) -> list:
+        length = math.hypot(forward[0], forward[1]) or 1
+        fx, fy = forward[0] / length, forward[1] / length
+        cos = math.cos(math.radians(angle) / 2)
+        found = []
+        for obj in self.query_radius(pos, radius, kind, tags, exclude):
+            x, y = self._entries[obj][1]
+            dx, dy = x - pos[0], y - pos[1]
+            distance = math.hypot(dx, dy)
+            if not distance or (dx * fx + dy * fy) / distance >= cos:
+                found.append(obj)
+        return found
+
+    def nearest(self: Self,
+                pos: Point,
+                radius: Real,
+                kind: Optional[type | tuple]=None,
+                tags: Optional[Iterable[str]]=None,
+                exclude: Optional[object]=None) -> Optional[object]:
+        found = self.query_radius(pos, radius, kind, tags, exclude)
+        return found[0] if found else None
@@ -0,0 +1,231 @@
+import math
+from numbers import Real
+from typing import Self
+from typing import Optional
+
+import numpy as np
+import pygame as pg
+from pygame.typing import Point
+
+from systems.cache import SurfaceCache
+from systems.shading import ShadeTable
+from systems.lighting import LightGrid
+
+
+# Billboards drawn over the walls, tested against the per column wall depth
+# Scaled frames are cached by (surf, size bucket, shade band, darkness)
+# where buckets grow geometrically (every bucket is bucket_step bigger than
+# the last) and lit darkness is rounded to light_step
+class SpriteRenderer(object):
+    def __init__(self: Self,
+                 size: Point,
+                 fov: Real,
+                 tile_size: Real,
+                 shades: Optional[ShadeTable]=None,
+                 bucket_step: Real=0.05,
+                 near: Real=0.05,
+                 light_step: Real=0.1,
+                 max_bytes: int=8 * 2 ** 20) -> None:
+
+        self._size = (int(size[0]), int(size[1]))
+        self._tile_size = tile_size
+        self._shades = shades
+        self._log_step = math.log1p(bucket_step)
+        self._near = near
+        self._light_step = light_step
+        self._frames = SurfaceCache(max_bytes)
+        # entity: surf
+        self._entities = {}
+        self.fov = fov
+
+    @property
+    def fov(self: Self) -> Real:
+        return self._fov
+
+    @fov.setter
+    def fov(self: Self, value: Real) -> None:
+        self._fov = value
+        self._plane = math.tan(math.radians(value) / 2)
+
+    @property
+    def frames(self: Self) -> SurfaceCache:
+        return self._frames
+
+    @property
+    def entities(self: Self) -> dict:
+        return self._entities
+
+    def add(self: Self, entity: object, surf: pg.Surface) -> None:
+        self._entities[entity] = surf
+
+    def remove(self: Self, entity: object) -> None:
+        self._entities.pop(entity, None)
+
+    def _frame(self: Self,
+               surf: pg.Surface,
+               height: Real,
+               distance: Real,
+               darkness: Real) -> pg.Surface:
+
+        bucket = round(math.log(max(height, 1)) / self._log_step)
+        band = 0 if self._shades is None else self._shades.band(distance)
+        key = (surf, bucket, band, darkness)
+        frame = self._frames.get(key)
+        if frame is None:
+            height = math.exp(bucket * self._log_step)
+            width = height * surf.get_width() / surf.get_height()
+            frame = pg.transform.scale(
+                surf, (max(round(width), 1), max(round(height), 1)),
+            )
+            if self._shades is not None:
+                frame = self._shades.darken(
+                    frame, self._shades.factors(darkness)[band],
+                )
+            self._frames.set(key, frame)
+        return frame
+
+    # renders the registered entities together with others, a tuple of
+    # (sprites, positions, elevations, heights) for things that aren't
+    # entities (pooled projectiles), so everything is sorted as one batch
+    # with lights every sprite is shaded by the light on its tile
+    def render(self: Self,
+               surf: pg.Surface,
+               pos: Point,
+               forward: Point,
+               eye: Real,
+               horizon: Real,
+               depth: np.ndarray,
+               darkness: Real=1,
+               others: Optional[tuple]=None,
+               lights: Optional[LightGrid]=None) -> None:
+
+        entities = self._entities
+        sprites = list(entities.values())
+        positions = np.array(
+            [entity.pos for entity in entities], dtype=np.float64,
+        ).reshape(-1, 2)
+        elevations = np.array(
+            [entity.elevation for entity in entities], dtype=np.float64,
+        )
+        heights = np.array(
+            [entity.height for entity in entities], dtype=np.float64,
+        )
+        if others is not None and len(others[0]):
+            sprites += list(others[0])
+            positions = np.concatenate((positions, others[1]))
+            elevations = np.concatenate((elevations, others[2]))
+            heights = np.concatenate((heights, others[3]))
+        if not sprites:
+            return
+        if lights is not None and self._shades is not None:
+            step = self._light_step
+            darkness = np.round(
+                darkness * lights.multiplier_at(positions) / step,
+            ) * step
+        self.draw(
+            surf,
+            sprites,
+            positions,
+            elevations,
+            heights,
+            pos,
+            forward,
+            eye,
+            horizon,
+            depth,
+            darkness,
+        )
+
+    def draw(self: Self,
+             surf: pg.Surface,
+             sprites: list[pg.Surface],
+             positions: np.ndarray,
+             elevations: np.ndarray,
+             heights: np.ndarray,
+             pos: Point,
+             forward: Point,
+             eye: Real,
+             horizon: Real,
+             depth: np.ndarray,
+             darkness: Real | np.ndarray=1) -> None:
+
+        # darkness is one value or one per sprite
+        width, height = self._size
+        # camera space
+        rel = positions - pos
+        distances = rel[:, 0] * forward[0] + rel[:, 1] * forward[1]
+        offsets = rel[:, 1] * forward[0] - rel[:, 0] * forward[1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scales = self._tile_size / distances
+            centers = width / 2 * (1 + offsets / (distances * self._plane))
+        sizes = heights * scales
+        aspects = np.array(
+            [sprite.get_width() / sprite.get_height() for sprite in sprites],
+        )
+        half_widths = sizes * aspects / 2
+        lefts = np.floor(centers - half_widths).astype(np.intp)
+        rights = np.ceil(centers + half_widths).astype(np.intp)
+        tops = horizon * height - (elevations + heights - eye) * scales
+
+        # culling (behind, offscreen, too small, fully occluded)
+        visible = (
+            (distances > self._near)
+            & (rights > 0)
+            & (lefts < width)
+            & (tops < height)
+            & (tops + sizes > 0)
+            & (sizes >= 1)
+        )
+        if not visible.any():
+            return
+        starts = np.clip(lefts, 0, width - 1)
+        ends = np.clip(rights, 1, width)
+        # padded so that end == width is a valid reduceat index
+        padded = np.append(depth, -np.inf)
+        pairs = np.empty(len(starts) * 2, dtype=np.intp)
+        pairs[0::2] = starts
+        pairs[1::2] = ends
+        farthest = np.maximum.reduceat(padded, pairs)[0::2]
+        visible &= farthest > distances
+
+        # back to front
+        order = np.flatnonzero(visible)
+        order = order[np.argsort(-distances[order], kind='stable')]
+        for dex in order:
+            distance = distances[dex]
+            frame = self._frame(
+                sprites[dex],
+                sizes[dex],
+                distance,
+                float(darkness[dex]) if np.ndim(darkness) else darkness,
+            )
+            frame_width, frame_height = frame.get_size()
+            x = round(centers[dex] - frame_width / 2)
+            y = round(tops[dex] + (sizes[dex] - frame_height) / 2)
+            start = max(x, 0)
+            end = min(x + frame_width, width)
+            if start >= end:
+                continue
+            shown = depth[start:end] > distance
+            if shown.all():
+                surf.blit(
+                    frame,
+                    (start, y),
+                    (start - x, 0, end - start, frame_height),
+                )
+                continue
+            # runs of unoccluded columns
+            changes = np.flatnonzero(np.diff(shown.astype(np.int8))) + 1
+            bounds = np.concatenate(((0, ), changes, (end - start, )))
+            for run_start, run_end in zip(bounds[:-1], bounds[1:]):
+                if shown[run_start]:
+                    surf.blit(
+                        frame,
+                        (start + run_start, y),
+                        (
+                            start + run_start - x,
+                            0,
+                            run_end - run_start,
+                            frame_height,
+                        ),
+                    )
@@ -0,0 +1,184 @@
+from typing import Self
+from typing import Optional
+
+import pygame as pg
+from pygame.typing import ColorLike
+
+from systems.cache import SurfaceCache
+
+# rasterized up front by every atlas, anything else is added when first used
+PRINTABLE = ''.join(chr(code) for code in range(32, 127))
+
+
+# whether every printable glyph of font has the same advance
+def monospace(font: pg.Font) -> bool:
+    advances = {
+        metric[4] if metric else None for metric in font.metrics(PRINTABLE)
+    }
+    return len(advances) == 1 and None not in advances
+
+
+# Every glyph of one monospace font (so one size) in one color on a single
+# surface
+# Strings are composed by blitting glyph rects out of the atlas one advance
+# apart, which only matches font.render for monospace fonts (proportional
+# ones have kerning and fractional advances)
+class GlyphAtlas(object):
+    def __init__(self: Self,
+                 font: pg.Font,
+                 color: ColorLike=(255, 255, 255),
+                 antialias: bool=1,
+                 chars: str=PRINTABLE) -> None:
+        assert monospace(font), 'glyph atlases need monospace fonts'
+        self._font = font
+        self._color = color
+        self._antialias = antialias
+        self._advance = font.metrics(' ')[0][4]
+        # rendered lines can be taller than get_height()
+        self._height = font.render(' ', antialias, color).get_height()
+        self._glyphs = {} # char: rect in the atlas
+        self._surf = pg.Surface((256, self._height), pg.SRCALPHA)
+        self._x = 0 # where the next glyph goes
+        self.add(chars)
+
+    @property
+    def surf(self: Self) -> pg.Surface:
+        return self._surf
+
+    @property
+    def height(self: Self) -> int:
+        return self._height
+
+    def __contains__(self: Self, char: str) -> bool:
+        return char in self._glyphs
+
+    def add(self: Self, chars: str) -> None:
+        for char in chars:
+            if char in self._glyphs:
+                continue
+            metric = self._font.metrics(char)[0]
+            assert metric and metric[4] == self._advance, (
+                f'{char!r} is wider than the font\'s other glyphs'
+            )
+            glyph = self._font.render(char, self._antialias, self._color)
+            width = glyph.get_width()
+            if self._x + width > self._surf.get_width():
+                # doubles the atlas, glyph rects stay where they were
+                surf = pg.Surface(
+                    (max(self._surf.get_width() * 2, self._x + width),
+                     self._height),
+                    pg.SRCALPHA,
+                )
+                surf.blit(self._surf, (0, 0))
+                self._surf = surf
+            self._surf.blit(glyph, (self._x, 0))
+            self._glyphs[char] = pg.Rect(self._x, 0, width, self._height)
+            self._x += width
+
+    # same as font.size
+    def size(self: Self, text: str) -> tuple[int, int]:
+        return self._advance * len(text), self._font.get_height()
+
+    def render(self: Self,
+               text: str,
+               bgcolor: Optional[ColorLike]=None) -> pg.Surface:
+        self.add(text)
+        width = self._advance * len(text)
+        height = self._height
+        if bgcolor is None:
+            surf = pg.Surface((width, height), pg.SRCALPHA)
+            # max copies overlapping glyphs onto the transparent surface
+            # without darkening antialiased edges
+            flags = pg.BLEND_RGBA_MAX
+        else:
+            surf = pg.Surface((width, height))
+            surf.fill(bgcolor)
+            flags = 0
+        glyphs = self._glyphs
+        blits = []
+        x = 0
+        for char in text:
+            blits.append((self._surf, (x, 0), glyphs[char], flags))
+            x += self._advance
+        surf.blits(blits, doreturn=0)
+        return surf
+
+
+# Atlases per (font, color, antialias) with an LRU of whole strings on top
+# Strings that can't be composed from single lines of glyphs (wrapped,
+# multiline or in a proportional font) are rendered by the font but still
+# cached
+class TextEngine(object):
+    def __init__(self: Self, max_bytes: int=2 ** 22) -> None:
+        self._atlases = {} # (font, color, antialias): atlas
+        self._monospace = {} # font: bool
+        self._strings = SurfaceCache(max_bytes)
+
+    @property
+    def atlases(self: Self) -> int:
+        return len(self._atlases)
+
+    @property
+    def strings(self: Self) -> SurfaceCache:
+        return self._strings
+
+    def atlas(self: Self,
+              font: pg.Font,
+              color: ColorLike=(255, 255, 255),
+              antialias: bool=1) -> GlyphAtlas:
+        key = (font, tuple(pg.Color(color)), bool(antialias))
+        atlas = self._atlases.get(key)
+        if atlas is None:
+            atlas = self._atlases[key] = GlyphAtlas(font, color, antialias)
+        return atlas
+
+    # same as font.render (the result is shared, copy it before drawing on
+    # it)
+    def render(self: Self,
+               font: pg.Font,
+               text: str,
+               antialias: bool=1,
+               color: ColorLike=(255, 255, 255),
+               bgcolor: Optional[ColorLike]=None,
+               wraplength: int=0) -> pg.Surface:
+        key = (
+            font,
+            text,
+            bool(antialias),
+            tuple(pg.Color(color)),
+            None if bgcolor is None else tuple(pg.Color(bgcolor)),
+            wraplength,
+        )
+        surf = self._strings.get(key)
+        if surf is not None:
+            return surf
+        if wraplength or '\n' in text or not self._fits(font):
+            surf = font.render(
+                text, antialias, color, bgcolor, wraplength=wraplength,
+            )
+        else:
+            surf = self.atlas(font, color, antialias).render(text, bgcolor)
+        self._strings.set(key, surf)
+        return surf
+
+    # same as font.size
+    def size(self: Self, font: pg.Font, text: str) -> tuple[int, int]:
+        if '\n' in text or not self._fits(font):
+            return font.size(text)
+        return self.atlas(font).size(text)
+
+    def clear(self: Self) -> None:
+        self._atlases = {}
+        self._monospace = {}
+        self._strings.clear()
+
+    # whether font can have an atlas
+    def _fits(self: Self, font: pg.Font) -> bool:
+        fits = self._monospace.get(font)
+        if fits is None:
+            fits = self._monospace[font] = monospace(font)
+        return fits
+
+
+# shared by the game's HUD and the editor's widgets
+TEXT = TextEngine()
@@ -0,0 +1,242 @@
+import re
+import math
+from typing import Self
+from typing import Optional
+
+import numpy as np
+from pygame.typing import Point
+
+from ract.utils import gen_tile_key
+from systems.geometry import TileGeometry
+
+# pulls the integers out of a tile key so that the separator doesn't matter
+_TILE_KEY_NUMBERS = re.compile(r'-?\d+')
+
+
+def parse_tile_key(key: str) -> tuple[int, int]:
+    x, y = _TILE_KEY_NUMBERS.findall(key)[:2]
+    return (int(x), int(y))
+
+
+# Dense (x, y) indexed copy of the dict tilemap for vectorized passes
+# Cells without a tile have solid = 0 and darkness = nan
+# There is always at least 1 empty cell of padding so out of bounds lookups
+# can be clipped onto it
+class TileGrid(object):
+    def __init__(self: Self, tilemap: dict, padding: int=1) -> None:
+        self._tilemap = tilemap
+        self._padding = max(padding, 1)
+        self._version = 0
+        self._color_version = 0
+        self._changed = set()
+        self._geometry = TileGeometry()
+        self.rebuild()
+
+    @property
+    def tilemap(self: Self) -> dict:
+        return self._tilemap
+
+    @tilemap.setter
+    def tilemap(self: Self, value: dict) -> None:
+        self._tilemap = value
+        self._changed = set()
+        self.rebuild()
+
+    # keys of every tile updated since the tilemap was set
+    @property
+    def changed(self: Self) -> set[str]:
+        return self._changed
+
+    @property
+    def origin(self: Self) -> tuple[int, int]:
+        return self._origin
+
+    @property
+    def shape(self: Self) -> tuple[int, int]:
+        return self._solid.shape
+
+    # incremented on every change so that dependents know when to refresh
+    @property
+    def version(self: Self) -> int:
+        return self._version
+
+    # only incremented when solid, top, bottom or darkness change
+    @property
+    def color_version(self: Self) -> int:
+        return self._color_version
+
+    @property
+    def geometry(self: Self) -> TileGeometry:
+        return self._geometry
+
+    # geometry row of every cell (-1 if the tile has no rect / semitile)
+    @property
+    def rows(self: Self) -> np.ndarray:
+        return self._rows
+
+    @property
+    def solid(self: Self) -> np.ndarray:
+        return self._solid
+
+    @property
+    def elevation(self: Self) -> np.ndarray:
+        return self._elevation
+
+    @property
+    def height(self: Self) -> np.ndarray:
+        return self._height
+
+    @property
+    def top(self: Self) -> np.ndarray:
+        return self._top
+
+    @property
+    def bottom(self: Self) -> np.ndarray:
+        return self._bottom
+
+    @property
+    def darkness(self: Self) -> np.ndarray:
+        return self._darkness
+
+    @property
+    def texture(self: Self) -> np.ndarray:
+        return self._texture
+
+    def rebuild(self: Self) -> None:
+        tiles = {
+            parse_tile_key(key): data for key, data in self._tilemap.items()
+        }
+        if tiles:
+            xs = [tile[0] for tile in tiles]
+            ys = [tile[1] for tile in tiles]
+            self._origin = (
+                min(xs) - self._padding, min(ys) - self._padding,
+            )
+            shape = (
+                max(xs) - min(xs) + 1 + self._padding * 2,
+                max(ys) - min(ys) + 1 + self._padding * 2,
+            )
+        else:
+            self._origin = (-self._padding, -self._padding)
+            shape = (self._padding * 2 + 1, self._padding * 2 + 1)
+
+        self._solid = np.zeros(shape, dtype=np.bool_)
+        self._elevation = np.zeros(shape, dtype=np.float32)
+        self._height = np.zeros(shape, dtype=np.float32)
+        self._top = np.zeros((*shape, 3), dtype=np.uint8)
+        self._bottom = np.zeros((*shape, 3), dtype=np.uint8)
+        self._darkness = np.full(shape, np.nan, dtype=np.float32)
+        self._texture = np.full(shape, -1, dtype=np.int16)
+        self._rows = np.full(shape, -1, dtype=np.intp)
+        self._geometry.clear()
+        for tile, data in tiles.items():
+            self._write_data(
+                (tile[0] - self._origin[0], tile[1] - self._origin[1]), data,
+            )
+        self._version += 1
+        self._color_version += 1
+
+    def index(self: Self, pos: Point) -> Optional[tuple[int, int]]:
+        x = math.floor(pos[0]) - self._origin[0]
+        y = math.floor(pos[1]) - self._origin[1]
+        if 0 <= x < self._solid.shape[0] and 0 <= y < self._solid.shape[1]:
+            return (x, y)
+        return None
+
+    # out of bounds positions are clipped onto the (empty) padding
+    # truncating instead of flooring is fine because of the padding too
+    def indices(self: Self,
+                xs: np.ndarray,
+                ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        ix = (xs - self._origin[0]).astype(np.intp)
+        iy = (ys - self._origin[1]).astype(np.intp)
+        np.clip(ix, 0, self._solid.shape[0] - 1, out=ix)
+        np.clip(iy, 0, self._solid.shape[1] - 1, out=iy)
+        return (ix, iy)
+
+    # floor height under every (xs, ys) for things at z: the top of the
+    # solid tile there if it isn't above z, 0 otherwise
+    # rect / semitile tiles are only a floor inside their bounds
+    def floors(self: Self,
+               xs: np.ndarray,
+               ys: np.ndarray,
+               z: np.ndarray) -> np.ndarray:
+        index = self.indices(xs, ys)
+        tops = self._elevation[index] + self._height[index]
+        under = self._solid[index] & (tops <= z)
+        rows = self._rows[index]
+        thin = rows >= 0
+        if thin.any():
+            bounds = self._geometry.bounds[rows[thin]]
+            x = xs[thin]
+            y = ys[thin]
+            under[thin] &= (
+                (x >= bounds[:, 0]) & (x <= bounds[:, 2])
+                & (y >= bounds[:, 1]) & (y <= bounds[:, 3])
+            )
+        return np.where(under, tops, 0)
+
+    # index into the raveled arrays
+    def flat_indices(self: Self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        ix, iy = self.indices(xs, ys)
+        ix *= self._solid.shape[1]
+        ix += iy
+        return ix
+
+    # call after set_tile
+    def update(self: Self, pos: Point) -> None:
+        key = gen_tile_key(pos)
+        self._changed.add(key)
+        data = self._tilemap.get(key)
+        index = self.index(pos)
+        if index is None:
+            if data is not None:
+                self.rebuild()
+            return
+        self._write(index, data)
+        self._version += 1
+
+    # removes the tile at pos from the tilemap and updates
+    def remove(self: Self, pos: Point) -> None:
+        self._tilemap.pop(gen_tile_key(pos), None)
+        self.update(pos)
+
+    def _write(self: Self,
+               index: tuple[int, int],
+               data: Optional[dict]) -> None:
+        solid = self._solid[index]
+        top = tuple(self._top[index])
+        bottom = tuple(self._bottom[index])
+        darkness = self._darkness[index]
+        self._write_data(index, data)
+        if (solid != self._solid[index]
+            or top != tuple(self._top[index])
+            or bottom != tuple(self._bottom[index])
+            or not np.array_equal(
+                darkness, self._darkness[index], equal_nan=1,
+            )):
+            self._color_version += 1
+
+    def _write_data(self: Self,
+                    index: tuple[int, int],
+                    data: Optional[dict]) -> None:
+        self._rows[index] = self._geometry.set(
+            (index[0] + self._origin[0], index[1] + self._origin[1]), data,
+        )
+        if data is None:
+            self._solid[index] = 0
+            self._elevation[index] = 0
+            self._height[index] = 0
+            self._top[index] = 0
+            self._bottom[index] = 0
+            self._darkness[index] = np.nan
+            self._texture[index] = -1
+            return
+        self._solid[index] = 1
+        self._elevation[index] = data.get('elevation', 0)
+        self._height[index] = data.get('height', 1)
+        self._top[index] = data.get('top', (0, 0, 0))
+        self._bottom[index] = data.get('bottom', (0, 0, 0))
+        darkness = data.get('darkness')
+        self._darkness[index] = np.nan if darkness is None else darkness
+        self._texture[index] = data.get('texture', 0)
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+import pytest
+
+from ract.utils import gen_tile_key
+
+from systems.tiles import TileGrid
+from systems.collision import SubStepper
+from systems.collision import sweep_tiles
+from systems.collision import resolve_tiles
+
+# one semitile line along each axis, at x 0.5 and y 2.5
+LINES = {
+    gen_tile_key((0, 0)): {
+        'height': 1,
+        'semitile': {'axis': 1, 'pos': (0.5, 0), 'width': 1},
+    },
+    gen_tile_key((0, 2)): {
+        'height': 1,
+        'semitile': {'axis': 0, 'pos': (0, 0.5), 'width': 1},
+    },
+}
+
+
+# Walks a body across a semitile line at every speed, split into steps like
+# the game loop does, with the same sweep and resolve as EntityStore.collide
+@pytest.mark.parametrize('axis, start', ((0, (-0.5, 0.5)), (1, (0.5, 1.5))))
+@pytest.mark.parametrize('speed', (0.01, 0.05, 0.2, 0.5, 2))
+def test_semitiles_stop_bodies(axis, start, speed):
+    lines = TileGrid(LINES)
+    stepper = SubStepper()
+    one = np.ones(1)
+    radius = 0.2
+    pos = np.array([start], dtype=np.float64)
+    elevation = np.zeros(1)
+    steps, rel_step = stepper.split(1, speed)
+    for tick in range(math.ceil(2 / speed)):
+        for step in range(steps):
+            old_pos = pos.copy()
+            old_elevation = elevation.copy()
+            pos[0, axis] += speed * rel_step
+            sweep_tiles(
+                lines, old_pos, pos, elevation,
+                one * 0.8, one * radius, one * 0.2,
+            )
+            resolve_tiles(
+                lines, old_pos, pos, old_elevation, elevation,
+                np.zeros(1), one * 0.8, one * radius, one * 0.2,
+            )
+    assert pos[0, axis] < start[axis] + 1